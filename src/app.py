@@ -1,8 +1,11 @@
 # Importing Libraries
-import json, base64
+import json, base64, functools
 import miscellaneous_functions as mf
+import job_queue
+import data_store as ds
 import radial_bar_chart
 import pandas as pd
+import time
 import threading
 import concurrent.futures
 import calendar
@@ -14,8 +17,7 @@ import dash_bootstrap_components as dbc
 from dash_iconify import DashIconify
 from dash import Dash, html, dcc, Input, Output, State, callback_context, clientside_callback, no_update, ctx
 from dash.exceptions import PreventUpdate
-from flask import Flask, session
-from flask_caching import Cache
+from flask import Flask, session, jsonify
 import secrets
 
 # Initialising Dash App
@@ -24,28 +26,99 @@ server.secret_key = secrets.token_hex(16)
 app = Dash(__name__, server=server, assets_folder="assets", title="Welcome to Chatstat", suppress_callback_exceptions=True, update_title=None, external_stylesheets=[dbc.themes.BOOTSTRAP, "https://fonts.googleapis.com/css2?family=Poppins:wght@200;300;400;500;600;700&display=swap"])
 app.css.config.serve_locally = True
 
-# Read the latest Data directly from s3
-cache = Cache(app.server, config={"CACHE_TYPE": "SimpleCache",  "CACHE_DEFAULT_TIMEOUT": 43200})
-read_s3 = cache.memoize()(mf.read_s3)
-get_report_metadata = cache.memoize()(mf.get_report_metadata)
+# Saved report metadata is read from s3 once and shared by the workers through the result cache
+get_report_metadata = mf.get_report_metadata
+
+# Dataset is kept in process, so callbacks share the indexed frame without unpickling it
+# Every 5 minutes the ETag of the data on s3 is checked, a new version loads in the background while the previous one keeps being served
+# and delta partitions written since the last check are merged into the current one
+query_backend = ds.backends[mf.query_backend]()
+
+# Every worker maps the dataset published in the local snapshot directory, so their memory is shared and a restart needs no download
+# The first worker to find it behind s3 loads or merges the new data under a lock and publishes it, the others map what it wrote
+local_snapshot = ds.LocalSnapshot(mf.snapshot_cache_dir)
+def sync_dataset(version, dataset=None):
+    # Only partitions written after the snapshot of this version, those written before it are already in its rows
+    keys = mf.list_deltas(None if version is None else mf.version_time(version))
+    def published():
+        current = local_snapshot.current()
+        return (current is not None) and (current["version"] == version) and set(keys).issubset(current["partitions"])
+
+    if not published():
+        with local_snapshot.lock():
+            if not published():
+                if (version is not None) and (mf.data_version() != version):
+                    # The source moved on since the version was probed, building it now would publish the newer data under this version
+                    raise ds.StaleVersion(f"Source no longer holds version {version}")
+                new_dataset = local_snapshot.read(version, query_backend) or ds.Dataset(mf.read_s3(columns=mf.app_columns), mf.count_error, mf.exact_count_limit, query_backend)
+                new_keys = [key for key in keys if key not in new_dataset.partitions]
+                if new_keys:
+                    new_dataset = new_dataset.append(mf.read_deltas(new_keys, columns=mf.app_columns), new_keys)
+                local_snapshot.write(version, new_dataset)
+
+    current = local_snapshot.current()
+    if (dataset is not None) and (current["version"] == version) and (dataset.partitions == frozenset(current["partitions"])):
+        return dataset
+    new_dataset = local_snapshot.read(version, query_backend)
+    if new_dataset is None:
+        # Another worker published a newer version in the meantime, the holder probes again and loads that one
+        raise ds.StaleVersion(f"Local snapshot no longer holds version {version}")
+    return new_dataset
+
+def load_dataset(version):
+    return sync_dataset(version)
+
+def update_dataset(dataset):
+    return sync_dataset(dataset_holder.version, dataset)
+
+dataset_holder = ds.DatasetHolder(load_dataset, refresh_interval=300, probe=mf.data_version, update=update_dataset)
+get_dataset = dataset_holder.get
+
+# Loading starts with the process rather than with the first request
+dataset_holder.refresh()
+
+def served_version():
+    dataset = get_dataset()
+    return f"{dataset_holder.version}+{len(dataset.partitions)}"
+
+# Version of the data being served, polled by the page to refresh the charts once a new version is loaded
+@app.server.route("/version")
+def data_version():
+    return jsonify(version=served_version())
+
+# Hits and misses of the result cache in this worker
+@app.server.route("/cache")
+def cache_stats():
+    return jsonify(mf.result_cache.stats())
+
+# Chart outputs are shared by the workers, keyed on the callback inputs, the version of the data they were computed from
+# and the day, as the time filters count back from today
+def shared_chart(callback):
+    @functools.wraps(callback)
+    def cached_callback(*args):
+        key = [callback.__name__, served_version(), date.today().isoformat(), args]
+        return mf.result_cache.get("charts", key, lambda: callback(*args))
+    return cached_callback
 
 @app.server.before_first_request
 def warm_up_cache():
     with concurrent.futures.ThreadPoolExecutor() as executor:
         futures = [
-            executor.submit(read_s3),
+            executor.submit(get_dataset),
             executor.submit(get_report_metadata)
         ]
         concurrent.futures.wait(futures)
 
-cache_refresh_lock = threading.Lock()
-def saved_report_refresh():
-    with cache_refresh_lock:
+# Saved reports are reconciled with s3 in the background, posted reports are written through to the cached views in between
+def saved_report_reconcile():
+    while True:
         try:
-            cache.delete_memoized(get_report_metadata)
-            get_report_metadata()
+            mf.report_generation()
         except:
             pass
+        time.sleep(mf.metadata_reconcile_interval / 2)
+
+threading.Thread(target=saved_report_reconcile, daemon=True).start()
 
 
 VALID_USERS = {"jaskeerat.nonu@chatstat.com": "1234", "klubiniecki@chatstat.com":"", "j.teng@chatstat.com":""}
@@ -64,17 +137,16 @@ comment_classification_colors = {"Cyberbullying": "#FF4C4C", "Offensive": "#25D3
 time_periods = {"D": "Daily", "W": "Weekly", "M": "Monthly", "Q": "Quarterly", "A": "Yearly", "all": "Custom Range"}
 
 
-# Filter Functions
-def user_filter(dataframe, user_value):
-    dataframe = dataframe[dataframe["email_users"] == user_value]
-    return dataframe
+# Filter Functions, each one narrows a FilterSpec that the dataset or a cube answers in a single pass
+def user_filter(spec, user_value):
+    spec = spec.narrow(user=user_value)
+    return spec
 
-def time_filter(dataframe, time_value, date_range_value):
+def time_range(time_value, date_range_value):
     if(time_value == "all"):
         end_date = datetime.combine(datetime.strptime(date_range_value[1], "%Y-%m-%d"), datetime.max.time())
         start_date = datetime.combine(datetime.strptime(date_range_value[0], "%Y-%m-%d"), datetime.min.time())
-        dataframe = dataframe[(dataframe["createTime_contents"] >= start_date) & (dataframe["createTime_contents"] <= end_date)]
-        return dataframe
+        return start_date, end_date
     else:
         end_date = datetime.combine(datetime.now(), datetime.max.time())
         if(time_value == "W"):
@@ -88,31 +160,35 @@ def time_filter(dataframe, time_value, date_range_value):
         else:
             start_date = end_date
         start_date = datetime.combine(start_date, datetime.min.time())
+        return start_date, end_date
 
-        dataframe = dataframe[(dataframe["createTime_contents"] >= start_date) & (dataframe["createTime_contents"] <= end_date)]
-        return dataframe
+# Rows are ordered by createTime_contents and cube cells by day inside each user, so the range is found with a binary search
+def time_filter(spec, time_value, date_range_value, time_column="createTime_contents"):
+    start_date, end_date = time_range(time_value, date_range_value)
+    spec = spec.narrow(time_column=time_column, start_time=start_date, end_time=end_date)
+    return spec
 
-def member_filter(dataframe, member_value):
+def member_filter(spec, member_value):
     if((member_value is not None) and (member_value != "all")):
-        dataframe = dataframe[dataframe["name_childrens"] == member_value]
-    return dataframe
+        spec = spec.narrow(member=member_value)
+    return spec
 
-def platform_filter(dataframe, platform_value):
+def platform_filter(spec, platform_value):
     if((platform_value is not None) and (platform_value != "all")):
-        dataframe = dataframe[dataframe["platform_contents"] == platform_value]
-    return dataframe
+        spec = spec.narrow(platform=platform_value)
+    return spec
 
-def alert_filter(dataframe, alert_value):
+def alert_filter(spec, alert_value):
     if((alert_value is not None) and (alert_value != "all")):
-        dataframe = dataframe[dataframe["alert_contents"] == alert_value]
-    return dataframe
+        spec = spec.narrow(alert=alert_value)
+    return spec
 
-def slider_filter(dataframe, slider_value, date_dict):
-    start_date = pd.to_datetime(date_dict[str(slider_value[0])], format="%Y-%m-%d").date()
-    end_date = pd.to_datetime(date_dict[str(slider_value[1])], format="%Y-%m-%d").date()
-    dataframe["commentTime_comments"] = dataframe["commentTime_comments"].dt.date
-    dataframe = dataframe[(dataframe["commentTime_comments"] >= start_date) & (dataframe["commentTime_comments"] <= end_date)]
-    return dataframe
+# Comment time ranges are answered from the rows ordered by commentTime_comments
+def slider_filter(spec, slider_value, date_dict):
+    start_date = pd.to_datetime(date_dict[str(slider_value[0])], format="%Y-%m-%d")
+    end_date = pd.to_datetime(date_dict[str(slider_value[1])], format="%Y-%m-%d") + pd.Timedelta(days=1) - pd.Timedelta(1, unit="ns")
+    spec = spec.narrow(time_column="commentTime_comments", start_time=start_date, end_time=end_date)
+    return spec
 
 
 # Function if No Data is available
@@ -333,6 +409,8 @@ report_page = html.Div(className="report_page_container", id="report_page_contai
 
         dcc.Download(id="download_file"),
         dcc.Store(id="report_generate_url_store", storage_type="session"),
+        dcc.Store(id="report_job_store", storage_type="memory"),
+        dcc.Interval(id="report_job_interval", interval=1000, disabled=True),
         html.Div(className="report_side_download", id="report_side_download")
     ]),
 
@@ -409,8 +487,7 @@ report_generate_tab = html.Div(className="report_generate_container", children=[
     ]),
     html.Div(className="report_button_list", children=[
         dmc.Button("Preview", className="report_button", id="preview_report_button", variant="filled", color="green", n_clicks=0, leftIcon=DashIconify(icon="el:eye-open", width=20)),
-        dmc.Button("Create Report", className="report_button", id="generate_report_button", variant="filled", color="green", n_clicks=0, leftIcon=DashIconify(icon="heroicons-outline:document-report", width=25)),
-        dcc.Store(id="create_report_payload_store", storage_type="memory")
+        dmc.Button("Create Report", className="report_button", id="generate_report_button", variant="filled", color="green", n_clicks=0, leftIcon=DashIconify(icon="heroicons-outline:document-report", width=25))
     ]),
     html.Img(src=image_folder + "report_person.png", alt="Report Person", className="report_image", height="100%")
 ])
@@ -451,7 +528,7 @@ main_app = dmc.NotificationsProvider(
 
         dmc.Notification(className="dashboard_notification", id="saved_report_notification_message", loading=True, action="hide", autoClose=5000,
                          color="green", title="Loading Report", message="Creating report from saved options"),
-        dcc.Interval(id="data_refresh_interval", interval=3600000),
+        dcc.Interval(id="data_refresh_interval", interval=300000),
         html.Div(id="page_title"), sidebar, header,
         html.Div(className="content_container", id="content_container", children=[
             html.Div(className="sidebar_placeholder", children=[]),
@@ -489,6 +566,7 @@ login_page = html.Div(className="login_page", children=[
 app.layout = html.Div([
     dcc.Location(id="url_path", refresh=False),
     dcc.Store(id="user_session_store", storage_type="session"),
+    dcc.Store(id="data_version_store", storage_type="memory"),
     html.Div(id="page_content")
 ])
 
@@ -523,22 +601,29 @@ def logging_out(logout_btn_click):
 
 
 # Login - Main App Logic
+# The version store of the browser is given the version being served when the main app is shown, so the first poll only updates it once the data changes
+# Other pages leave it as it is and never wait for the dataset
 @app.callback(
-    Output("page_content", "children"),
-    [Input("url_path", "pathname"), Input("user_session_store", "data")]
+    [Output("page_content", "children"), Output("data_version_store", "data")],
+    [Input("url_path", "pathname"), Input("user_session_store", "data")],
+    State("data_version_store", "data")
 )
-def display_page(pathname, session_data):
+def display_page(pathname, session_data, current_version):
+    def show_main_app():
+        version = served_version()
+        return main_app, (no_update if version == current_version else version)
+
     if pathname in ["/", "/Login"]:
         if session_data and "user_email" in session_data:
-            return main_app
-        return login_page
+            return show_main_app()
+        return login_page, no_update
 
     elif pathname in ["/Home", "/Dashboard", "/Analytics", "/Report&Logs"]:
         if session_data and "user_email" in session_data:
-            return main_app
+            return show_main_app()
         else:
-            return dcc.Location(href="/Login", id="redirect_to_login")
-    return html.H3("404 Page Not Found")
+            return dcc.Location(href="/Login", id="redirect_to_login"), no_update
+    return html.H3("404 Page Not Found"), no_update
 
 
 # Website Main Page Navigation
@@ -591,6 +676,23 @@ def update_header(pathname):
     return title
 
 
+# Data Version
+clientside_callback(
+    """
+    function(n_intervals, current_version) {
+        return fetch("/version")
+            .then(response => response.json())
+            .then(data => data.version === current_version ? window.dash_clientside.no_update : data.version)
+            .catch(() => window.dash_clientside.no_update);
+    }
+    """,
+    Output("data_version_store", "data", allow_duplicate=True),
+    Input("data_refresh_interval", "n_intervals"),
+    State("data_version_store", "data"),
+    prevent_initial_call=True
+)
+
+
 # User Info
 @app.callback(
     [Output("user_name", "children"), Output("user_email", "children"), Output("user_plan", "children")],
@@ -599,7 +701,7 @@ def update_header(pathname):
 )
 def update_user_info(_, user_session):
     user_logged_in_email = user_session["user_email"]
-    user_info = mf.get_info(read_s3(), user_logged_in_email)
+    user_info = mf.get_info(get_dataset(), user_logged_in_email)
     return user_info["name_users"].split(" ")[0].title(), user_info["email_users"], user_info["plan_users"].title()
 
 
@@ -640,8 +742,7 @@ def update_popover_date_picker(time_value):
     State("user_session_store", "data")
 )
 def update_dashboard_member_dropdown(member_value, user_session):
-    df = read_s3()
-    df = df[df["email_users"] == user_session["user_email"]]
+    df = get_dataset().select(user_filter(ds.FilterSpec(), user_session["user_email"]), ["name_childrens"])
     user_list = sorted(df[(df["name_childrens"].astype(str) != "nan") & (df["name_childrens"].astype(str) != "no")]["name_childrens"].unique())
     if(len(user_list) == 1):
         disable_flag = True
@@ -659,8 +760,7 @@ def update_dashboard_member_dropdown(member_value, user_session):
     State("user_session_store", "data")
 )
 def update_report_member_dropdown(_, user_session):
-    df = read_s3()
-    df = df[df["email_users"] == user_session["user_email"]]
+    df = get_dataset().select(user_filter(ds.FilterSpec(), user_session["user_email"]), ["name_childrens"])
     user_list = sorted(df[(df["name_childrens"].astype(str) != "nan") & (df["name_childrens"].astype(str) != "no")]["name_childrens"].unique())
     data = [{"label": user.split(" ")[0].title(), "value": user} for user in user_list]
     return data
@@ -673,8 +773,7 @@ def update_report_member_dropdown(_, user_session):
     State("user_session_store", "data")
 )
 def update_dashboard_platform_dropdown(platform_value, user_session):
-    df = read_s3()
-    df = df[df["email_users"] == user_session["user_email"]]
+    df = get_dataset().select(user_filter(ds.FilterSpec(), user_session["user_email"]), ["platform_contents"])
     platform_list = sorted(df[(df["platform_contents"].astype(str) != "nan") & (df["platform_contents"].astype(str) != "no")]["platform_contents"].unique())
     if(len(platform_list) == 1):
         disable_flag = True
@@ -697,9 +796,9 @@ def update_dashboard_platform_dropdown(platform_value, user_session):
 )
 def update_report_platform_checkbox(member_value, user_session):
     # Filters
-    df = read_s3()
-    df = df[df["email_users"] == user_session["user_email"]]
-    df = member_filter(df, member_value)
+    spec = user_filter(ds.FilterSpec(), user_session["user_email"])
+    spec = member_filter(spec, member_value)
+    df = get_dataset().select(spec, ["platform_contents"])
 
     platform_list = sorted(df[(df["platform_contents"].astype(str) != "nan") & (df["platform_contents"].astype(str) != "no")]["platform_contents"].unique())
     data = dmc.SimpleGrid(cols=2, spacing="md", children=[dmc.Checkbox(label=platform.title(), value=platform.lower(), color="green", disabled=True if member_value == "all" else False) for platform in platform_list])
@@ -713,8 +812,7 @@ def update_report_platform_checkbox(member_value, user_session):
     State("user_session_store", "data")
 )
 def update_dashboard_alert_dropdown(alert_value, user_session):
-    df = read_s3()
-    df = df[df["email_users"] == user_session["user_email"]]
+    df = get_dataset().select(user_filter(ds.FilterSpec(), user_session["user_email"]), ["alert_contents"])
     alert_list = df["alert_contents"].unique()
     data = [{"label": "All Alerts", "value": "all"}] + [{"label": alert.title(), "value": alert}
                 for alert in sorted(alert_list, key=lambda x: ["high", "medium", "low"].index(x.lower())
@@ -733,8 +831,7 @@ def update_dashboard_alert_dropdown(alert_value, user_session):
     State("user_session_store", "data")
 )
 def update_report_alert_checkbox(_, user_session):
-    df = read_s3()
-    df = df[df["email_users"] == user_session["user_email"]]
+    df = get_dataset().select(user_filter(ds.FilterSpec(), user_session["user_email"]), ["alert_contents"])
     alert_list = df["alert_contents"].unique()
     data = [dmc.Checkbox(label=alert.title(), value=alert.lower(), color="green") for alert in sorted(alert_list, key=lambda x: ["high", "medium", "low"].index(x.lower())
         if isinstance(x, str) and x.lower() in ["high", "medium", "low"] else float("inf"))
@@ -759,8 +856,7 @@ def reset_filters(_):
     State("user_session_store", "data")
 )
 def update_searchbar_dropdown(_, user_session):
-    df = read_s3()
-    df = df[df["email_users"] == user_session["user_email"]]
+    df = get_dataset().select(user_filter(ds.FilterSpec(), user_session["user_email"]), ["name_childrens"])
     data = [{"group": "Members", "label": child_name.title(), "value": child_name} for child_name in sorted(df["name_childrens"].unique())]
     return data
 
@@ -786,16 +882,20 @@ def toggle_modal_and_searchbar(searchbar_value, modal_opened):
     [Output("child_overview", "title"), Output("overview_avatar", "children"), Output("overview_info", "children"),
      Output("overview_platform", "children"), Output("overview_alert", "children"), Output("overview_classification", "children"), Output("overview_comments", "children")],
     Input("searchbar", "value"),
-    [State("time_control", "value"), State("date_range_picker", "value")]
+    [State("time_control", "value"), State("date_range_picker", "value"), State("user_session_store", "data")]
 )
-def update_overview_card(searchbar_value, time_value, date_range_value):
+@shared_chart
+def update_overview_card(searchbar_value, time_value, date_range_value, user_session):
     if(searchbar_value is None):
         raise PreventUpdate
     else:
         # Filters
-        overview_df = read_s3()
-        overview_df = member_filter(overview_df, searchbar_value)
-        overview_df = time_filter(overview_df, time_value, date_range_value)
+        overview_spec = user_filter(ds.FilterSpec(), user_session["user_email"])
+        overview_spec = member_filter(overview_spec, searchbar_value)
+        overview_df = get_dataset().select(time_filter(overview_spec, time_value, date_range_value), ["name_childrens", "email_childrens", "id_childrens"])
+
+        content_cube = get_dataset().content_cube
+        overview_cells_spec = time_filter(overview_spec, time_value, date_range_value, "day")
 
         overview_info_children = [
             html.Div(className="overview_info_option", children=[html.Strong("Name:"), html.P(searchbar_value)]),
@@ -804,15 +904,14 @@ def update_overview_card(searchbar_value, time_value, date_range_value):
         ]
 
         # Platform Risk Distribution
-        overview_platform_df = overview_df.copy()
-        overview_platform_df = overview_platform_df[(overview_platform_df["alert_contents"].str.lower() != "no") & (overview_platform_df["alert_contents"].str.lower() != "") & (overview_platform_df["alert_contents"].notna())]
-        overview_platform_df = overview_platform_df[(overview_platform_df["result_contents"].str.lower() != "no") & (overview_platform_df["result_contents"].str.lower() != "") & (overview_platform_df["result_contents"].notna())]
+        overview_platform_df = content_cube.select_shared(overview_cells_spec.narrow(valid=("alert_contents", "result_contents")), ["platform_contents"])
 
         if overview_platform_df.empty:
             platform_div = no_data_graph()
         else:
-            overview_platform_df = overview_platform_df.groupby(by=["platform_contents"], as_index=False)["id_contents"].nunique()
+            overview_platform_df = content_cube.counts(overview_platform_df, ["platform_contents"])
             overview_platform_df.columns = ["platform", "count"]
+            overview_platform_df = overview_platform_df.astype({"platform": str})
             overview_platform_df["percentage_count"] = (overview_platform_df["count"]/overview_platform_df["count"].sum()) * 100
             overview_platform_df["percentage_count"] = overview_platform_df["percentage_count"].round().astype(int)
             overview_platform_df.loc[overview_platform_df["percentage_count"].idxmax(), "percentage_count"] += 100 - overview_platform_df["percentage_count"].sum()
@@ -833,14 +932,14 @@ def update_overview_card(searchbar_value, time_value, date_range_value):
             platform_div = dmc.Grid(className="overview_platform_container", children=[dmc.Col(platform_ring_legend, span=6), dmc.Col(platform_ring, span=4, offset=1)], gutter="xs", justify="center", align="center")
 
         # Alert Count
-        overview_alert_df = overview_df.copy()
-        overview_alert_df = overview_alert_df[(overview_alert_df["alert_contents"].str.lower() != "no") & (overview_alert_df["alert_contents"].str.lower() != "") & (overview_alert_df["alert_contents"].notna())]
-        overview_alert_df = overview_alert_df.groupby(by=["alert_contents"], as_index=False)["id_contents"].nunique()
+        overview_alert_df = content_cube.select_shared(overview_cells_spec.narrow(valid=("alert_contents",)), ["alert_contents"])
+        overview_alert_df = content_cube.counts(overview_alert_df, ["alert_contents"])
 
         if overview_alert_df.empty:
             overview_alert_df = pd.DataFrame(columns=["alert", "count"])
         else:
             overview_alert_df.columns = ["alert", "count"]
+            overview_alert_df = overview_alert_df.astype({"alert": str})
 
         categories = ["High", "Medium", "Low"]
         for cat in categories:
@@ -858,15 +957,14 @@ def update_overview_card(searchbar_value, time_value, date_range_value):
         ])
 
         # Content Classification
-        overview_classification_df = overview_df.copy()
-        overview_classification_df = overview_classification_df[(overview_classification_df["result_contents"].str.lower() != "no") & (overview_classification_df["result_contents"].str.lower() != "") & (overview_classification_df["result_contents"].notna())]
-        overview_classification_df = overview_classification_df[(overview_classification_df["alert_contents"].str.lower() != "no") & (overview_classification_df["alert_contents"].str.lower() != "") & (overview_classification_df["alert_contents"].notna())]
+        overview_classification_df = content_cube.select_shared(overview_cells_spec.narrow(valid=("result_contents", "alert_contents")), ["result_contents"])
 
         if overview_classification_df.empty:
             content_classification_chart = no_data_graph()
         else:
-            overview_classification_df = overview_classification_df.groupby(by=["result_contents"], as_index=False)["id_contents"].nunique()
+            overview_classification_df = content_cube.counts(overview_classification_df, ["result_contents"])
             overview_classification_df.columns = ["category", "count"]
+            overview_classification_df = overview_classification_df.astype({"category": str})
             overview_classification_df.sort_values(by=["count"], ascending=[False], inplace=True)
 
             for classification in category_bar_colors.keys():
@@ -886,19 +984,17 @@ def update_overview_card(searchbar_value, time_value, date_range_value):
             content_classification_chart = dcc.Graph(figure=overview_classification_fig, config={"displayModeBar": False})
 
         # Comment Area Chart
-        overview_comments_df = read_s3()
-        overview_comments_df = member_filter(overview_comments_df, searchbar_value)
-        overview_comments_df = overview_comments_df[(overview_comments_df["alert_comments"].str.lower() != "no") & (overview_comments_df["alert_comments"].str.lower() != "") & (overview_comments_df["alert_comments"].notna())]
-        overview_comments_df = overview_comments_df[(overview_comments_df["result_comments"].str.lower() != "no") & (overview_comments_df["result_comments"].str.lower() != "") & (overview_comments_df["result_comments"].notna())]
-        overview_comments_df = overview_comments_df[overview_comments_df["commentTime_comments"] >= datetime.now()-relativedelta(years=1)]
+        overview_comments_spec = overview_spec.narrow(time_column="commentTime_comments", start_time=datetime.now()-relativedelta(years=1), valid=("alert_comments", "result_comments"))
+        overview_comments_df = get_dataset().select(overview_comments_spec, ["commentTime_comments", "result_comments", "id_comments"])
 
         if overview_comments_df.empty:
             comment_area_chart = no_data_graph()
         else:
             overview_comments_df["commentTime_comments"] = pd.to_datetime(overview_comments_df["commentTime_comments"].apply(lambda x: x.replace(day=1))).dt.date
             overview_comments_df["commentTime_comments"] = pd.to_datetime(overview_comments_df["commentTime_comments"])
-            overview_comments_df = overview_comments_df.groupby(by=["commentTime_comments", "result_comments"], as_index=False)["id_comments"].nunique()
+            overview_comments_df = query_backend.grouped_distinct_count(overview_comments_df, ["commentTime_comments", "result_comments"], "id_comments")
             overview_comments_df.columns = ["commentTime", "result", "count"]
+            overview_comments_df = overview_comments_df.astype({"result": str})
             total_counts = overview_comments_df.groupby("commentTime")["count"].sum()
             overview_comments_df["percentage"] = overview_comments_df.apply(lambda x: (x["count"] / total_counts[x["commentTime"]]) * 100, axis=1)
 
@@ -928,27 +1024,27 @@ def update_overview_card(searchbar_value, time_value, date_range_value):
 # KPI Count Card
 @app.callback(
     Output("kpi_alert_count_container", "children"),
-    [Input("time_control", "value"), Input("date_range_picker", "value"), Input("member_dropdown", "value"), Input("alert_dropdown", "value")],
+    [Input("time_control", "value"), Input("date_range_picker", "value"), Input("member_dropdown", "value"), Input("alert_dropdown", "value"), Input("data_version_store", "data")],
     State("user_session_store", "data")
 )
-def update_kpi_count(time_value, date_range_value, member_value, alert_value, user_session):
-    df = read_s3()
-    alert_count_df = df[df["email_users"] == user_session["user_email"]]
-    alert_count_df = alert_count_df[(alert_count_df["alert_contents"].str.lower() != "no") & (alert_count_df["alert_contents"].str.lower() != "") & (alert_count_df["alert_contents"].notna())]
+@shared_chart
+def update_kpi_count(time_value, date_range_value, member_value, alert_value, data_version, user_session):
+    content_cube = get_dataset().content_cube
+    alert_count_spec = user_filter(ds.FilterSpec(valid=("alert_contents",)), user_session["user_email"])
 
     # Filters
-    alert_count_df = member_filter(alert_count_df, member_value)
-    alert_count_df = alert_filter(alert_count_df, alert_value)
+    alert_count_spec = member_filter(alert_count_spec, member_value)
+    alert_count_spec = alert_filter(alert_count_spec, alert_value)
 
     if(time_value == "all"):
-        alert_count_df = time_filter(alert_count_df, time_value, date_range_value)
+        alert_count_df = content_cube.select_shared(time_filter(alert_count_spec, time_value, date_range_value, "day"), [])
         from_date = datetime.strptime(date_range_value[0], "%Y-%m-%d").strftime("%b %d, %Y")
         to_date = datetime.strptime(date_range_value[1], "%Y-%m-%d").strftime("%b %d, %Y")
         card = [
             dmc.Text("Number of Alerts", className="kpi_alert_count_label"),
             html.Div(className="kpi_alert_count", children=[
                 dmc.Group(children=[
-                    dmc.Text(alert_count_df["id_contents"].nunique(), className="kpi_alert_number"),
+                    dmc.Text(content_cube.total(alert_count_df), className="kpi_alert_number"),
                     dmc.Text(f"Between\n{from_date}\n& {to_date}", className="kpi_alert_info")
                 ], position="center", style={"margin": "0px", "padding": "0px"}),
             ])
@@ -956,8 +1052,7 @@ def update_kpi_count(time_value, date_range_value, member_value, alert_value, us
         return card
 
     else:
-        alert_count_df.set_index("createTime_contents", inplace=True)
-        alert_count_df = alert_count_df.resample(time_value)["id_contents"].nunique()
+        alert_count_df = content_cube.period_counts(content_cube.select(alert_count_spec, ["day"]), time_value)
         alert_count_df = alert_count_df.reset_index()
         alert_count_df.columns = ["date", "count"]
 
@@ -1014,42 +1109,37 @@ def update_kpi_count(time_value, date_range_value, member_value, alert_value, us
 @app.callback(
     [Output("kpi_platform_count", "children"), Output("kpi_platform_store", "data")],
     [Input("time_control", "value"), Input("date_range_picker", "value"), Input("member_dropdown", "value"), Input("alert_dropdown", "value"),
-     Input("kpi_platform_backward", "n_clicks"), Input("kpi_platform_forward", "n_clicks")],
+     Input("kpi_platform_backward", "n_clicks"), Input("kpi_platform_forward", "n_clicks"), Input("data_version_store", "data")],
     [State("kpi_platform_store", "data"), State("user_session_store", "data")]
 )
-def update_kpi_platform(time_value, date_range_value, member_value, alert_value, n_clicks_backward, n_clicks_forward, current_index, user_session):
-    df = read_s3()
-    kpi_platform_df = df[df["email_users"] == user_session["user_email"]]
-    kpi_platform_df = kpi_platform_df[(kpi_platform_df["alert_contents"].str.lower() != "no") & (kpi_platform_df["alert_contents"].str.lower() != "") & (kpi_platform_df["alert_contents"].notna())]
-    kpi_platform_df = kpi_platform_df[(kpi_platform_df["result_contents"].str.lower() != "no") & (kpi_platform_df["result_contents"].str.lower() != "") & (kpi_platform_df["result_contents"].notna())]
+def update_kpi_platform(time_value, date_range_value, member_value, alert_value, n_clicks_backward, n_clicks_forward, data_version, current_index, user_session):
+    content_cube = get_dataset().content_cube
+    kpi_platform_spec = user_filter(ds.FilterSpec(valid=("alert_contents", "result_contents")), user_session["user_email"])
 
     # Filters
-    kpi_platform_df = member_filter(kpi_platform_df, member_value)
-    kpi_platform_df = alert_filter(kpi_platform_df, alert_value)
-    kpi_platform_df_copy = kpi_platform_df.copy()
-    kpi_platform_df = time_filter(kpi_platform_df, time_value, date_range_value)
+    kpi_platform_spec = member_filter(kpi_platform_spec, member_value)
+    kpi_platform_spec = alert_filter(kpi_platform_spec, alert_value)
+    kpi_platform_df = content_cube.select_shared(time_filter(kpi_platform_spec, time_value, date_range_value, "day"), ["platform_contents", "result_contents"])
 
     if kpi_platform_df.empty:
         card = dmc.Card(className="kpi_platform_card_no_data", children=[html.P("No Cards to Display")], withBorder=True, radius="5px")
         current_index = 0
         return card, current_index
     else:
-        kpi_platform_df = kpi_platform_df.groupby(by=["platform_contents", "result_contents"], as_index=False)["id_contents"].nunique()
+        kpi_platform_df = content_cube.counts(kpi_platform_df, ["platform_contents", "result_contents"])
         kpi_platform_df.columns = ["platform", "result", "count"]
+        kpi_platform_df = kpi_platform_df.astype({"platform": str, "result": str})
         kpi_platform_df.sort_values(by=["platform", "count"], ascending=[True, False], inplace=True)
 
         kpi_platform_list = []
         for platform in kpi_platform_df["platform"].unique():
 
-            kpi_platform_count_df = kpi_platform_df_copy.copy()
-
             # Producing Increase for each Platform
             if(time_value != "all"):
                 # Filters
-                kpi_platform_count_df = kpi_platform_count_df[kpi_platform_count_df["platform_contents"] == platform]
+                kpi_platform_count_df = content_cube.select(platform_filter(kpi_platform_spec, platform), ["day"])
 
-                kpi_platform_count_df.set_index("createTime_contents", inplace=True)
-                kpi_platform_count_df = kpi_platform_count_df.resample(time_value)["id_contents"].nunique()
+                kpi_platform_count_df = content_cube.period_counts(kpi_platform_count_df, time_value)
                 kpi_platform_count_df = kpi_platform_count_df.reset_index()
                 kpi_platform_count_df.columns = ["date", "count"]
                 if(len(kpi_platform_count_df) == 1):
@@ -1108,26 +1198,28 @@ def update_kpi_platform(time_value, date_range_value, member_value, alert_value,
 # Content Classification Radial Chart
 @app.callback(
     [Output("content_classification_radial_chart", "children"), Output("save_as_image", "style"), Output("download_radial_chart_store", "data")],
-    [Input("time_control", "value"), Input("date_range_picker", "value"), Input("member_dropdown", "value"), Input("platform_dropdown", "value"), Input("alert_dropdown", "value")],
+    [Input("time_control", "value"), Input("date_range_picker", "value"), Input("member_dropdown", "value"), Input("platform_dropdown", "value"), Input("alert_dropdown", "value"),
+     Input("data_version_store", "data")],
     State("user_session_store", "data")
 )
-def update_radial_chart(time_value, date_range_value, member_value, platform_value, alert_value, user_session):
-    df = read_s3()
-    result_contents_df = df[df["email_users"] == user_session["user_email"]]
-    result_contents_df = result_contents_df[(result_contents_df["result_contents"].str.lower() != "no") & (result_contents_df["result_contents"].str.lower() != "") & (result_contents_df["result_contents"].notna())]
-    result_contents_df = result_contents_df[(result_contents_df["alert_contents"].str.lower() != "no") & (result_contents_df["alert_contents"].str.lower() != "") & (result_contents_df["alert_contents"].notna())]
+@shared_chart
+def update_radial_chart(time_value, date_range_value, member_value, platform_value, alert_value, data_version, user_session):
+    content_cube = get_dataset().content_cube
+    result_contents_spec = user_filter(ds.FilterSpec(valid=("result_contents", "alert_contents")), user_session["user_email"])
 
     # Filters
-    result_contents_df = time_filter(result_contents_df, time_value, date_range_value)
-    result_contents_df = member_filter(result_contents_df, member_value)
-    result_contents_df = platform_filter(result_contents_df, platform_value)
-    result_contents_df = alert_filter(result_contents_df, alert_value)
+    result_contents_spec = time_filter(result_contents_spec, time_value, date_range_value, "day")
+    result_contents_spec = member_filter(result_contents_spec, member_value)
+    result_contents_spec = platform_filter(result_contents_spec, platform_value)
+    result_contents_spec = alert_filter(result_contents_spec, alert_value)
+    result_contents_df = content_cube.select_shared(result_contents_spec, ["result_contents"])
 
     if result_contents_df.empty:
         return no_data_graph(), {"display": "none"}, None
     else:
-        result_contents_df = result_contents_df.groupby(by=["result_contents"], as_index=False)["id_contents"].nunique()
+        result_contents_df = content_cube.counts(result_contents_df, ["result_contents"])
         result_contents_df.columns = ["classification", "count"]
+        result_contents_df = result_contents_df.astype({"classification": str})
         result_contents_df["radial"] = (result_contents_df["count"] / result_contents_df["count"].sum()) * 270
         result_contents_df["total_radial"] = 270
         result_contents_df.sort_values(by=["radial"], ascending=True, inplace=True)
@@ -1166,25 +1258,26 @@ def download_radial_chart(button_click, data_base64):
 # Risk Categories Horizontal Bar
 @app.callback(
     Output("risk_categories_horizontal_bar", "children"),
-    [Input("time_control", "value"), Input("date_range_picker", "value"), Input("member_dropdown", "value"), Input("platform_dropdown", "value")],
+    [Input("time_control", "value"), Input("date_range_picker", "value"), Input("member_dropdown", "value"), Input("platform_dropdown", "value"), Input("data_version_store", "data")],
     State("user_session_store", "data")
 )
-def update_horizontal_bar(time_value, date_range_value, member_value, platform_value, user_session):
-    df = read_s3()
-    risk_categories_df = df[df["email_users"] == user_session["user_email"]]
-    risk_categories_df = risk_categories_df[(risk_categories_df["result_contents"].str.lower() != "no") & (risk_categories_df["result_contents"].str.lower() != "") & (risk_categories_df["result_contents"].notna())]
-    risk_categories_df = risk_categories_df[(risk_categories_df["alert_contents"].str.lower() != "no") & (risk_categories_df["alert_contents"].str.lower() != "") & (risk_categories_df["alert_contents"].notna())]
+@shared_chart
+def update_horizontal_bar(time_value, date_range_value, member_value, platform_value, data_version, user_session):
+    content_cube = get_dataset().content_cube
+    risk_categories_spec = user_filter(ds.FilterSpec(valid=("result_contents", "alert_contents")), user_session["user_email"])
 
     # Filters
-    risk_categories_df = time_filter(risk_categories_df, time_value, date_range_value)
-    risk_categories_df = member_filter(risk_categories_df, member_value)
-    risk_categories_df = platform_filter(risk_categories_df, platform_value)
+    risk_categories_spec = time_filter(risk_categories_spec, time_value, date_range_value, "day")
+    risk_categories_spec = member_filter(risk_categories_spec, member_value)
+    risk_categories_spec = platform_filter(risk_categories_spec, platform_value)
+    risk_categories_df = content_cube.select_shared(risk_categories_spec, ["result_contents"])
 
     if risk_categories_df.empty:
         return no_data_graph()
     else:
-        risk_categories_df = risk_categories_df.groupby(by=["result_contents"], as_index=False)["id_contents"].nunique()
+        risk_categories_df = content_cube.counts(risk_categories_df, ["result_contents"])
         risk_categories_df.columns = ["category", "count"]
+        risk_categories_df = risk_categories_df.astype({"category": str})
         risk_categories_df["percentage_of_total"] = (risk_categories_df["count"] / risk_categories_df["count"].sum()) * 100
         risk_categories_df["percentage_of_total"] = risk_categories_df["percentage_of_total"].round().astype(int)
         risk_categories_df.loc[risk_categories_df["percentage_of_total"].idxmax(), "percentage_of_total"] += 100 - risk_categories_df["percentage_of_total"].sum()
@@ -1222,24 +1315,26 @@ def update_horizontal_bar(time_value, date_range_value, member_value, platform_v
 # Content Risk Bar Chart
 @app.callback(
     Output("content_risk_bar_chart", "children"),
-    [Input("time_control", "value"), Input("date_range_picker", "value"), Input("member_dropdown", "value"), Input("platform_dropdown", "value")],
+    [Input("time_control", "value"), Input("date_range_picker", "value"), Input("member_dropdown", "value"), Input("platform_dropdown", "value"), Input("data_version_store", "data")],
     State("user_session_store", "data")
 )
-def update_bar_chart(time_value, date_range_value, member_value, platform_value, user_session):
-    df = read_s3()
-    risk_content_df = df[df["email_users"] == user_session["user_email"]]
-    risk_content_df = risk_content_df[(risk_content_df["alert_contents"].str.lower() != "no") & (risk_content_df["alert_contents"].str.lower() != "") & (risk_content_df["alert_contents"].notna())]
+@shared_chart
+def update_bar_chart(time_value, date_range_value, member_value, platform_value, data_version, user_session):
+    content_cube = get_dataset().content_cube
+    risk_content_spec = user_filter(ds.FilterSpec(valid=("alert_contents",)), user_session["user_email"])
 
     # Filters
-    risk_content_df = time_filter(risk_content_df, time_value, date_range_value)
-    risk_content_df = member_filter(risk_content_df, member_value)
-    risk_content_df = platform_filter(risk_content_df, platform_value)
+    risk_content_spec = time_filter(risk_content_spec, time_value, date_range_value, "day")
+    risk_content_spec = member_filter(risk_content_spec, member_value)
+    risk_content_spec = platform_filter(risk_content_spec, platform_value)
+    risk_content_df = content_cube.select_shared(risk_content_spec, ["alert_contents", "platform_contents"])
 
     if risk_content_df.empty:
         return no_data_graph()
     else:
-        risk_content_df = risk_content_df.groupby(by=["alert_contents", "platform_contents"], as_index=False)["id_contents"].nunique()
+        risk_content_df = content_cube.counts(risk_content_df, ["alert_contents", "platform_contents"])
         risk_content_df.columns = ["alert", "platform", "count"]
+        risk_content_df = risk_content_df.astype({"alert": str, "platform": str})
         categories = ["High", "Medium", "Low"]
 
         # Handling Missing Values
@@ -1293,19 +1388,19 @@ def update_bar_chart(time_value, date_range_value, member_value, platform_value,
 @app.callback(
     [Output("comment_alert_line_chart_slider", "marks"), Output("comment_alert_line_chart_slider", "max"), Output("comment_alert_line_chart_slider", "min"),
      Output("comment_alert_line_chart_slider", "value"), Output("comment_alert_line_chart_slider_storage", "data")],
-    [Input("member_dropdown", "value")],
+    [Input("member_dropdown", "value"), Input("data_version_store", "data")],
     State("user_session_store", "data")
 )
-def update_line_chart_slider(member_value, user_session):
-    df = read_s3()
-    slider_df = df[df["email_users"] == user_session["user_email"]]
-    slider_df = slider_df[(slider_df["alert_comments"].str.lower() != "no") & (slider_df["alert_comments"].str.lower() != "") & (slider_df["alert_comments"].notna())]
+@shared_chart
+def update_line_chart_slider(member_value, data_version, user_session):
+    slider_spec = user_filter(ds.FilterSpec(valid=("alert_comments",)), user_session["user_email"])
 
     # Filters
-    slider_df = member_filter(slider_df, member_value)
+    slider_spec = member_filter(slider_spec, member_value)
+    slider_spec = slider_spec.narrow(time_column="commentTime_comments", start_time=date.today()-relativedelta(years=2))
+    slider_df = get_dataset().select(slider_spec, ["commentTime_comments"])
 
     slider_df["commentTime_comments"] = slider_df["commentTime_comments"].dt.date
-    slider_df = slider_df[slider_df["commentTime_comments"] >= date.today()-relativedelta(years=2)]
 
     try:
         min_date = slider_df["commentTime_comments"].min()
@@ -1332,22 +1427,23 @@ def update_line_chart_slider(member_value, user_session):
      Input("comment_alert_line_chart_slider", "value"), Input("comment_alert_line_chart_slider_storage", "data")],
     State("user_session_store", "data")
 )
+@shared_chart
 def update_line_chart(member_value, alert_value, slider_value, storage_dict, user_session):
-    df = read_s3()
-    alert_comment_df = df[df["email_users"] == user_session["user_email"]]
-    alert_comment_df = alert_comment_df[(alert_comment_df["alert_comments"].str.lower() != "no") & (alert_comment_df["alert_comments"].str.lower() != "") & (alert_comment_df["alert_comments"].notna())]
+    alert_comment_spec = user_filter(ds.FilterSpec(valid=("alert_comments",)), user_session["user_email"])
 
     # Filters
-    alert_comment_df = member_filter(alert_comment_df, member_value)
-    alert_comment_df = alert_filter(alert_comment_df, alert_value)
-    alert_comment_df = slider_filter(alert_comment_df, slider_value, storage_dict)
+    alert_comment_spec = member_filter(alert_comment_spec, member_value)
+    alert_comment_spec = alert_filter(alert_comment_spec, alert_value)
+    alert_comment_spec = slider_filter(alert_comment_spec, slider_value, storage_dict)
+    alert_comment_df = get_dataset().select(alert_comment_spec, ["commentTime_comments", "platform_contents", "id_comments"])
 
     if alert_comment_df.empty:
         return no_data_graph()
     else:
         alert_comment_df["commentTime_comments"] = pd.to_datetime(alert_comment_df["commentTime_comments"], format="%Y-%m-%d").dt.strftime("%b %Y")
-        alert_comment_df = alert_comment_df.groupby(by=["commentTime_comments", "platform_comments"], as_index=False)["id_comments"].nunique()
+        alert_comment_df = query_backend.grouped_distinct_count(alert_comment_df, ["commentTime_comments", "platform_contents"], "id_comments")
         alert_comment_df.columns = ["commentTime", "platform", "count"]
+        alert_comment_df = alert_comment_df.astype({"platform": str})
         alert_comment_df["commentTime"] = pd.to_datetime(alert_comment_df["commentTime"], format="%b %Y")
         alert_comment_df.sort_values(by="commentTime", inplace=True)
 
@@ -1377,26 +1473,28 @@ def update_line_chart(member_value, alert_value, slider_value, storage_dict, use
 # Comment Classification Pie Chart
 @app.callback(
     Output("comment_classification_pie_chart", "children"),
-    [Input("time_control", "value"), Input("date_range_picker", "value"), Input("member_dropdown", "value"), Input("platform_dropdown", "value"), Input("alert_dropdown", "value")],
+    [Input("time_control", "value"), Input("date_range_picker", "value"), Input("member_dropdown", "value"), Input("platform_dropdown", "value"), Input("alert_dropdown", "value"),
+     Input("data_version_store", "data")],
     State("user_session_store", "data")
 )
-def update_pie_chart(time_value, date_range_value, member_value, platform_value, alert_value, user_session):
-    df = read_s3()
-    result_comment_df = df[df["email_users"] == user_session["user_email"]]
-    result_comment_df = result_comment_df[(result_comment_df["result_comments"].str.lower() != "no") & (result_comment_df["result_comments"].str.lower() != "") & (result_comment_df["result_comments"].notna())]
-    result_comment_df = result_comment_df[(result_comment_df["alert_comments"].str.lower() != "no") & (result_comment_df["alert_comments"].str.lower() != "") & (result_comment_df["alert_comments"].notna())]
+@shared_chart
+def update_pie_chart(time_value, date_range_value, member_value, platform_value, alert_value, data_version, user_session):
+    comment_cube = get_dataset().comment_cube
+    result_comment_spec = user_filter(ds.FilterSpec(valid=("result_comments", "alert_comments")), user_session["user_email"])
 
     # Filters
-    result_comment_df = time_filter(result_comment_df, time_value, date_range_value)
-    result_comment_df = member_filter(result_comment_df, member_value)
-    result_comment_df = platform_filter(result_comment_df, platform_value)
-    result_comment_df = alert_filter(result_comment_df, alert_value)
+    result_comment_spec = time_filter(result_comment_spec, time_value, date_range_value, "day")
+    result_comment_spec = member_filter(result_comment_spec, member_value)
+    result_comment_spec = platform_filter(result_comment_spec, platform_value)
+    result_comment_spec = alert_filter(result_comment_spec, alert_value)
+    result_comment_df = comment_cube.select_shared(result_comment_spec, ["result_comments"])
 
     if result_comment_df.empty:
         return no_data_graph()
     else:
-        result_comment_df = result_comment_df.groupby(by=["result_comments"], as_index=False)["id_comments"].nunique()
+        result_comment_df = comment_cube.counts(result_comment_df, ["result_comments"])
         result_comment_df.columns = ["classification", "count"]
+        result_comment_df = result_comment_df.astype({"classification": str})
         result_comment_df.sort_values(by=["count"], ascending=True, inplace=True)
 
         comment_classification = px.pie(result_comment_df, values="count", names="classification", color="classification", color_discrete_map=comment_classification_colors)
@@ -1472,7 +1570,7 @@ def update_preview_report_overview(preview_button_click, member_value, time_rang
         raise PreventUpdate
     else:
         # Calling Lambda for Response Body
-        response_df = mf.generate_report(read_s3(), payload, None, True)
+        response_df = mf.generate_report(get_dataset(), payload)
         response_modal_div = []
         for _, res in response_df.iterrows():
             response_modal_div.append(html.Div(className="report_preview_overview_children", children=[
@@ -1524,9 +1622,20 @@ def update_preview_report_overview_pagination(modal_status, page, report_modal_d
         return "", 1, 1
 
 
+# Report Job Submission
+def submit_report_job(payload, source):
+    # Built in the background, the report page polls the job with report_job_interval until it is done
+    # A job id of None tells the poll that the queue was full
+    try:
+        job_id = mf.report_jobs.submit(mf.report_job, get_dataset(), served_version(), payload)
+    except job_queue.QueueFull:
+        job_id = None
+    return {"job_id": job_id, "source": source, "payload": payload}, False
+
+
 # Generate Report File
 @app.callback(
-    [Output("create_report_payload_store", "data"), Output("report_generate_url_store", "data")],
+    [Output("report_job_store", "data"), Output("report_job_interval", "disabled")],
     Input("generate_report_button", "n_clicks"),
     [State("report_filter_member", "value"), State("report_filter_daterange", "value"), State("report_filter_platform", "value"),
      State("report_filter_alert", "value"), State("report_filter_content", "value"), State("report_filter_type", "value"), State("user_session_store", "data")]
@@ -1542,11 +1651,7 @@ def generate_report_file(generate_button_click, member_value, time_range, platfo
         raise PreventUpdate
     else:
         mf.post_report_metadata(payload, datetime.now())
-        response_df, response_url = mf.generate_report(read_s3(), payload, None, False)
-        session["report_url"] = response_url
-
-        threading.Thread(target=saved_report_refresh, daemon=True).start()
-        return payload, response_url
+        return submit_report_job(payload, "generate")
 
 
 # Saved Report Saved Tab Pagination
@@ -1556,9 +1661,8 @@ def generate_report_file(generate_button_click, member_value, time_range, platfo
 State("user_session_store", "data")
 )
 def update_saved_report_pagination(_, user_session):
-    metadata_df = get_report_metadata()
-    metadata_df = metadata_df[metadata_df["email"] == user_session["user_email"]]
-    return ((len(metadata_df)-1)//5)+1
+    _, total_reports = mf.query_report_metadata(user_session["user_email"], 1, 5)
+    return ((total_reports-1)//5)+1
 
 
 # Saved Report Saved Tab Content
@@ -1568,13 +1672,8 @@ def update_saved_report_pagination(_, user_session):
     State("user_session_store", "data")
 )
 def update_saved_report_page_content(tab_value, pagination_page, user_session):
-    metadata_df = get_report_metadata()
-    metadata_df = metadata_df[metadata_df["email"] == user_session["user_email"]]
-
-    start_report = (pagination_page-1)*5
-    end_report = pagination_page*5
-    page_df = metadata_df.iloc[start_report:end_report]
-    page_df.reset_index(drop=True, inplace=True)
+    page_df, _ = mf.query_report_metadata(user_session["user_email"], pagination_page, 5)
+    page_df = page_df.reset_index(drop=True)
 
     saved_report_list = []
     saved_report_dict = {0: {}, 1: {}, 2: {}, 3: {}, 4: {}}
@@ -1642,7 +1741,7 @@ def update_saved_report_overview(card0_click, card1_click, card2_click, card3_cl
                 pass
 
         # Calling Lambda for response body
-        response_df = mf.generate_report(read_s3(), payload, None, True)
+        response_df = mf.generate_report(get_dataset(), payload)
         response_modal_div = []
         for _, res in response_df.iterrows():
             response_modal_div.append(html.Div(className="report_saved_overview_children", children=[
@@ -1700,6 +1799,10 @@ def update_saved_report_overview_pagination(modal_status, page, report_modal_dat
     [Input("report_generate_url_store", "data"), Input("url_path", "pathname")]
 )
 def update_download_report_block(generate_url, pathname):
+    return download_report_block()
+
+
+def download_report_block():
     latest_url = session.get("report_url", None)
     if(latest_url is None):
         return html.Div(className="report_side_download_no_data", children=[
@@ -1722,18 +1825,9 @@ def update_download_report_block(generate_url, pathname):
         ])
 
 
-# Download File to User Local Machine
-@app.callback(
-    Output("download_file", "data", allow_duplicate=True),
-    Input("create_report_payload_store", "data"),
-    prevent_initial_call=True
-)
-def download_from_generate(payload):
-    response_df, response_url, data_bytes = mf.generate_report(read_s3(), payload, "yes", False)
-    return dcc.send_bytes(data_bytes, filename=f"report.{payload['filetype']}")
-
+# Download Saved Report
 @app.callback(
-    Output("download_file", "data", allow_duplicate=True),
+    [Output("report_job_store", "data", allow_duplicate=True), Output("report_job_interval", "disabled", allow_duplicate=True)],
     Input("report_saved_overview_button", "n_clicks"),
     State("report_saved_card_payload_store", "data"),
     prevent_initial_call=True
@@ -1741,8 +1835,70 @@ def download_from_generate(payload):
 def download_from_saved(btn, payload):
     if not btn:
         raise PreventUpdate
-    response_df, response_url, data_bytes = mf.generate_report(read_s3(), payload, "yes", False)
-    return dcc.send_bytes(data_bytes, filename=f"report.{payload['filetype']}")
+    return submit_report_job(payload, "saved")
+
+
+# Report Job Progress, the File is sent to User Local Machine once it is ready
+@app.callback(
+    [Output("report_side_download", "children", allow_duplicate=True),
+     Output("generate_report_notification_message_container", "children", allow_duplicate=True),
+     Output("report_generate_url_store", "data"), Output("download_file", "data"),
+     Output("report_job_interval", "disabled", allow_duplicate=True)],
+    Input("report_job_interval", "n_intervals"),
+    State("report_job_store", "data"),
+    prevent_initial_call=True
+)
+def update_report_job(n_intervals, report_job):
+    if not report_job:
+        return no_update, no_update, no_update, no_update, True
+    if report_job["job_id"] is None:
+        notification = dmc.Notification(id="generate_report_notification_message", action="show", color="red", loading=False, autoClose=5000,
+                                        title="Too Many Reports", message="Reports are queued up, please try again in a minute")
+        return download_report_block(), notification, no_update, no_update, True
+
+    job = mf.report_jobs.status(report_job["job_id"])
+    if (job is not None) and (job["status"] in ["queued", "running"]):
+        return html.Div(className="report_side_download_no_data", children=[
+            DashIconify(icon="line-md:downloading-loop", width=65, color="#25D366"),
+            html.Strong("Generating Report" if job["status"] == "running" else "Report Queued"),
+            dmc.Progress(value=round(job["progress"] * 100), color="green", size="lg", style={"width": "80%"}),
+            html.Button(id="report_job_cancel_button", children="Cancel", n_clicks=0)
+        ]), no_update, no_update, no_update, False
+
+    if (job is None) or (job["status"] != "done"):
+        cancelled = (job is not None) and (job["status"] == "cancelled")
+        notification = dmc.Notification(id="generate_report_notification_message", action="show", color="yellow" if cancelled else "red", loading=False, autoClose=5000,
+                                        title="Report Cancelled" if cancelled else "Report Failed",
+                                        message="The report was not generated" if cancelled else "The report could not be generated, please try again")
+        return download_report_block(), notification, no_update, no_update, True
+
+    # The file the job left in the reports namespace, looked up with the version it was built from and never rebuilt here
+    # A file too large to send through the page, or no longer cached, is downloaded from its link instead
+    payload, result = report_job["payload"], job["result"]
+    artifact = mf.cached_report_artifact(result["version"], payload)
+    data_bytes = None if artifact is None else artifact.get("file")
+    generate_url = no_update
+    if (report_job["source"] == "generate") or (data_bytes is None):
+        session["report_url"] = generate_url = result["url"]
+    if data_bytes is None:
+        notification = dmc.Notification(id="generate_report_notification_message", action="show", color="green", loading=False, autoClose=10000,
+                                        title="Report Ready", message="Download the report from its link")
+        return download_report_block(), notification, generate_url, no_update, True
+    return download_report_block(), no_update, generate_url, dcc.send_bytes(data_bytes, filename=f"report.{payload['filetype']}"), True
+
+
+# Cancel Report Job
+@app.callback(
+    Output("report_job_store", "data", allow_duplicate=True),
+    Input("report_job_cancel_button", "n_clicks"),
+    State("report_job_store", "data"),
+    prevent_initial_call=True
+)
+def cancel_report_job(cancel_button_click, report_job):
+    # The poll shows the job as cancelled once it has stopped
+    if cancel_button_click and report_job and report_job["job_id"]:
+        mf.report_jobs.cancel(report_job["job_id"])
+    raise PreventUpdate
 
 
 # Preview Report Notification
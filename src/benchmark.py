@@ -0,0 +1,338 @@
+# Importing Libraries
+import io, os, sys
+import gc
+import time
+import resource
+import tempfile
+import tracemalloc
+import multiprocessing
+import numpy as np
+import pandas as pd
+import data_schema
+import data_generation
+import data_store as ds
+import miscellaneous_functions as mf
+import storage
+import report_index
+from chart_queries import chart_aggregations, comment_month_aggregations, month_rows
+
+
+def best_of(function, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def legacy_parse(data):
+    df = pd.read_csv(io.StringIO(data.decode('utf-8')), header=0)
+    df["createTime_contents"] = pd.to_datetime(df["createTime_contents"], format="%Y-%m-%d %H:%M:%S")
+    df["commentTime_comments"] = pd.to_datetime(df["commentTime_comments"], format="%Y-%m-%d %H:%M:%S")
+    return df
+
+
+def megabytes_per_million_rows(df):
+    return df.memory_usage(index=True, deep=True).sum() / 1e6 * (1e6 / len(df))
+
+
+def snapshot_bytes(df):
+    buffer = io.BytesIO()
+    data_schema.apply_schema(df.copy()).to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def loader_benchmark(df):
+    csv_buffer = io.BytesIO()
+    df.to_csv(csv_buffer, index=False)
+    csv_bytes = csv_buffer.getvalue()
+
+    snapshot_data = snapshot_bytes(df)
+
+    print(f"Loader ({len(df)} rows)")
+    print(f"  csv size:                  {len(csv_bytes) / 1e6:8.2f} MB")
+    print(f"  parquet size:              {len(snapshot_data) / 1e6:8.2f} MB")
+    print(f"  csv parse:                 {best_of(lambda: mf.parse_csv(csv_bytes)):8.3f} s")
+    print(f"  parquet parse:             {best_of(lambda: mf.parse_snapshot(snapshot_data)):8.3f} s")
+    print(f"  parquet parse (app cols):  {best_of(lambda: mf.parse_snapshot(snapshot_data, mf.app_columns)):8.3f} s")
+
+    print("Memory per 1M rows")
+    print(f"  object columns:            {megabytes_per_million_rows(legacy_parse(csv_bytes)):8.1f} MB")
+    print(f"  compact frame:             {megabytes_per_million_rows(mf.parse_snapshot(snapshot_data)):8.1f} MB")
+    print(f"  compact frame (app cols):  {megabytes_per_million_rows(mf.parse_snapshot(snapshot_data, mf.app_columns)):8.1f} MB")
+
+
+
+def rss_child(function, path, queue):
+    # Objects inherited from the parent are left out of garbage collection, walking them would count their pages
+    gc.freeze()
+    start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(path, "rb") as stream:
+        function(stream)
+    queue.put((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start) / 1e3)
+
+
+def peak_rss_megabytes(function, path):
+    # Peak resident memory of reading a file in a fresh child process, covering allocations tracemalloc does not see
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    process = context.Process(target=rss_child, args=(function, path, queue))
+    process.start()
+    peak = queue.get()
+    process.join()
+    return peak
+
+
+def csv_benchmark(df, block_size=1 << 22):
+    # Loading the csv output from a stream like the s3 response body, the whole body read and decoded against pyarrow
+    with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as csv_file:
+        df.to_csv(csv_file, index=False)
+    loaders = {
+        "read, decode, read_csv": lambda stream: legacy_parse(stream.read()),
+        "pyarrow stream": lambda stream: mf.read_csv_stream(stream, mf.app_columns),
+        "pyarrow bounded": lambda stream: mf.read_csv_stream(stream, mf.app_columns, block_size),
+    }
+
+    def timed(loader):
+        with open(csv_file.name, "rb") as stream:
+            loader(stream)
+
+    print(f"Csv loader ({len(df)} rows, {os.path.getsize(csv_file.name) / 1e6:.1f} MB)")
+    for name, loader in loaders.items():
+        print(f"  {name + ':':<27}{best_of(lambda: timed(loader), 3):8.3f} s {peak_rss_megabytes(loader, csv_file.name):8.1f} MB peak rss")
+    os.remove(csv_file.name)
+
+
+def anonymous_megabytes():
+    with open("/proc/self/smaps_rollup") as smaps:
+        return sum(int(line.split()[1]) for line in smaps if line.startswith("Anonymous:")) / 1e3
+
+
+def anonymous_child(function, queue):
+    gc.freeze()
+    start = anonymous_megabytes()
+    result = function()
+    queue.put(anonymous_megabytes() - start)
+
+
+def worker_megabytes(function):
+    # Memory a worker process holds on its own after calling function, mapped file pages live in the page cache shared by every worker
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    process = context.Process(target=anonymous_child, args=(function, queue))
+    process.start()
+    megabytes = queue.get()
+    process.join()
+    return megabytes
+
+
+def local_snapshot_benchmark(df):
+    # Startup of a worker from the parquet snapshot on s3 against mapping the dataset published in the local snapshot
+    snapshot_data = snapshot_bytes(df)
+    load = lambda: ds.Dataset(mf.parse_snapshot(snapshot_data, mf.app_columns))
+    with tempfile.TemporaryDirectory() as directory:
+        local_snapshot = ds.LocalSnapshot(directory)
+        write_seconds = best_of(lambda: local_snapshot.write("benchmark", load()), 1)
+        local_snapshot.read("benchmark")
+
+        print(f"Worker startup ({len(df)} rows)")
+        print(f"  parquet parse and build:   {best_of(load, 3):8.3f} s {worker_megabytes(load):8.1f} MB per worker")
+        print(f"  local snapshot map:        {best_of(lambda: local_snapshot.read('benchmark'), 3):8.3f} s {worker_megabytes(lambda: local_snapshot.read('benchmark')):8.1f} MB per worker")
+        print(f"  publish (build and write): {write_seconds:8.3f} s")
+
+
+def storage_benchmark(reports=200):
+    # A client per call as the report and metadata paths created before, against the shared one,
+    # then the saved report metadata read back through a local directory standing in for s3
+    shared_clients = storage.StorageClients(mf.aws_region)
+    shared_clients.s3()
+    print(f"Storage clients ({reports} saved reports)")
+    print(f"  new client per call:       {best_of(lambda: storage.StorageClients(mf.aws_region).s3(), 3) * 1e3:8.3f} ms")
+    print(f"  shared client:             {best_of(shared_clients.s3, 3) * 1e3:8.3f} ms")
+
+    storage_clients, saved_reports = mf.storage_clients, mf.saved_reports
+    with tempfile.TemporaryDirectory() as directory:
+        mf.storage_clients = storage.StorageClients(mf.aws_region, local_directory=directory)
+        mf.saved_reports = report_index.ReportIndex(mf.storage_clients, mf.metadata_path)
+        try:
+            current_time = pd.Timestamp("2024-01-01")
+            for report in range(reports):
+                payload = {"email": f"user{report % 10}@chatstat.com", "children": "child", "timerange": ["2024-01-01T00:00:00", "2024-02-01T00:00:00"],
+                           "platform": ["instagram"], "alert": ["high"], "contenttype": ["posts"], "filetype": "xlsx"}
+                mf.post_report_metadata(payload, current_time + pd.Timedelta(seconds=report))
+            print(f"  metadata read per object:  {best_of(lambda: mf.saved_reports.read_reports(mf.saved_reports.list_reports()), 3):8.3f} s")
+            print(f"  metadata read from index:  {best_of(mf.read_report_metadata, 3):8.3f} s")
+        finally:
+            mf.storage_clients, mf.saved_reports = storage_clients, saved_reports
+
+
+def report_export_benchmark(df, rows=100_000):
+    # An Excel report of rows rows built in memory by to_excel and uploaded from a copy of the buffer,
+    # against streaming it from a write-only workbook into a multipart upload, both to a local directory standing in for s3
+    report_df = df[["email_users", "name_childrens", "platform_contents", "createTime_contents", "alert_contents"]].head(rows).reset_index(drop=True)
+    report_df["text"] = "Lorem ipsum dolor sit amet, consectetur adipiscing elit."
+    with tempfile.TemporaryDirectory() as directory:
+        report_path = os.path.join(directory, "report.parquet")
+        report_df.to_parquet(report_path)
+        s3_client = storage.LocalS3Client(directory)
+
+        def in_memory(stream):
+            file_buffer = io.BytesIO()
+            pd.read_parquet(stream).to_excel(file_buffer, index=False)
+            s3_client.upload_fileobj(io.BytesIO(file_buffer.getvalue()), "bucket", "memory.xlsx")
+
+        def streamed(stream):
+            with storage.MultipartWriter(s3_client, "bucket", "streamed.xlsx", part_size=mf.report_part_bytes) as writer:
+                mf.write_xlsx(pd.read_parquet(stream), writer, mf.report_chunk_rows)
+
+        print(f"Excel report ({len(report_df)} rows)")
+        for name, export in {"to_excel and upload": in_memory, "streamed multipart": streamed}.items():
+            start = time.perf_counter()
+            megabytes = peak_rss_megabytes(export, report_path)
+            print(f"  {name + ':':<27}{time.perf_counter() - start:8.3f} s {megabytes:8.1f} MB peak rss")
+
+
+def partition_benchmark(df):
+    df = mf.parse_snapshot(snapshot_bytes(df), mf.app_columns)
+    dataset = ds.Dataset(df)
+    email = df["email_users"].iloc[0]
+
+    print("User rows")
+    print(f"  boolean mask:              {best_of(lambda: df[df['email_users'] == email]) * 1e3:8.3f} ms")
+    print(f"  partition slice:           {best_of(lambda: dataset.user_frame(email)) * 1e3:8.3f} ms")
+
+    user_df = dataset.user_frame(email)
+    start_time, end_time = user_df["createTime_contents"].quantile([0.25, 0.75])
+    print("Time range")
+    print(f"  boolean mask:              {best_of(lambda: user_df[(user_df['createTime_contents'] >= start_time) & (user_df['createTime_contents'] <= end_time)]) * 1e3:8.3f} ms")
+    print(f"  binary search:             {best_of(lambda: ds.time_slice(user_df, 'createTime_contents', start_time, end_time)) * 1e3:8.3f} ms")
+
+
+def peak_megabytes(function):
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+def filter_benchmark(df):
+    df = mf.parse_snapshot(snapshot_bytes(df), mf.app_columns)
+    dataset = ds.Dataset(df)
+    email = df["email_users"].iloc[0]
+    user_df = dataset.user_frame(email)
+    member = user_df["name_childrens"].dropna().iloc[0]
+    platform = user_df["platform_contents"].dropna().iloc[0]
+    start_time, end_time = user_df["createTime_contents"].quantile([0.25, 0.75])
+
+    def chained():
+        chained_df = dataset.df[dataset.df["email_users"] == email].copy()
+        chained_df = chained_df[chained_df["valid_alert_contents"] & chained_df["valid_result_contents"]]
+        chained_df = chained_df[(chained_df["createTime_contents"] >= start_time) & (chained_df["createTime_contents"] <= end_time)]
+        chained_df = chained_df[chained_df["name_childrens"] == member]
+        chained_df = chained_df[chained_df["platform_contents"] == platform]
+        return chained_df[["result_contents", "id_contents"]]
+
+    spec = ds.FilterSpec(user=email, time_column="createTime_contents", start_time=start_time, end_time=end_time, member=member, platform=platform, valid=("alert_contents", "result_contents"))
+    print("Filters")
+    print(f"  chained copies:            {best_of(chained) * 1e3:8.3f} ms {peak_megabytes(chained):8.2f} MB peak")
+    print(f"  filter spec:               {best_of(lambda: dataset.select(spec, ['result_contents', 'id_contents'])) * 1e3:8.3f} ms {peak_megabytes(lambda: dataset.select(spec, ['result_contents', 'id_contents'])):8.2f} MB peak")
+
+
+def backend_parity(df):
+    # Every chart aggregation is answered by both backends for every user and member, results must match exactly
+    df = mf.parse_snapshot(snapshot_bytes(df), mf.app_columns)
+    datasets = {name: ds.Dataset(df, backend=backend()) for name, backend in ds.backends.items()}
+    reference = datasets["pandas"]
+
+    timings = {name: 0.0 for name in datasets}
+    checked = 0
+    for email in df["email_users"].dropna().unique():
+        members = [None] + list(reference.user_frame(email)["name_childrens"].dropna().unique())
+        for member in members:
+            spec = ds.FilterSpec(user=email, member=member)
+            for chart, (cube_name, by, valid) in chart_aggregations.items():
+                results = {}
+                for name, dataset in datasets.items():
+                    cube = getattr(dataset, cube_name)
+                    cells = cube.select(spec.narrow(valid=valid), by)
+                    start = time.perf_counter()
+                    results[name] = cube.counts(cells, by)
+                    timings[name] += time.perf_counter() - start
+                pd.testing.assert_frame_equal(results["pandas"], results["duckdb"], obj=f"{chart} {email} {member}")
+                checked += 1
+
+            # Line chart and overview comment area aggregate raw comment rows by month
+            for chart, (by, valid, month_label) in comment_month_aggregations.items():
+                rows = month_rows(reference, spec.narrow(time_column="commentTime_comments", valid=valid), by + ["id_comments"], month_label)
+                results = {}
+                for name, dataset in datasets.items():
+                    start = time.perf_counter()
+                    results[name] = dataset.backend.grouped_distinct_count(rows, by, "id_comments")
+                    timings[name] += time.perf_counter() - start
+                pd.testing.assert_frame_equal(results["pandas"], results["duckdb"], obj=f"{chart} {email} {member}")
+                checked += 1
+
+    print(f"Backend parity ({checked} chart aggregations match)")
+    for name, seconds in timings.items():
+        print(f"  {name + ':':<27}{seconds * 1e3:8.1f} ms")
+
+
+def delta_benchmark(df, delta_rows=1000):
+    # A full load of the snapshot against merging one hour of new rows into the dataset already held
+    dataset = ds.Dataset(mf.parse_snapshot(snapshot_bytes(df), mf.app_columns))
+    end_time = pd.Timestamp(df["createTime_contents"].max())
+    delta = data_generation.generate_data(delta_rows, start=end_time - pd.Timedelta(hours=1), end=end_time)
+    rows = data_schema.apply_schema(pd.read_parquet(io.BytesIO(snapshot_bytes(delta)), columns=mf.app_columns))
+    dataset.append(rows)
+
+    print(f"Refresh ({len(df)} rows, {len(rows)} new)")
+    print(f"  full load:                 {best_of(lambda: ds.Dataset(mf.parse_snapshot(snapshot_bytes(pd.concat([df, delta], ignore_index=True)), mf.app_columns)), 2):8.3f} s")
+    print(f"  delta merge:               {best_of(lambda: dataset.append(rows), 2):8.3f} s")
+
+
+def coded_frame(total_rows, seed=0):
+    # Synthetic compact frame with the cardinalities of the dashboard data, without generating the row contents
+    rng = np.random.default_rng(seed)
+    content_ids = rng.integers(0, max(total_rows // 10, 1), total_rows)
+    return pd.DataFrame({
+        "platform_contents": pd.Categorical.from_codes(rng.integers(0, 6, total_rows), data_generation.platforms),
+        "result_comments": pd.Categorical.from_codes(rng.integers(0, 5, total_rows), ["no", "Mild", "Moderate", "Severe", "Extreme"]),
+        "id_contents": content_ids,
+        "id_comments": rng.permutation(total_rows),
+    })
+
+
+def distinct_benchmark(sizes=(200_000, 2_000_000, 20_000_000)):
+    for total_rows in sizes:
+        df = coded_frame(total_rows)
+        filtered_df = df.iloc[total_rows // 4: 3 * total_rows // 4]
+        filtered_df = filtered_df[filtered_df["platform_contents"] != data_generation.platforms[0]]
+        repeat = 5 if total_rows <= 2_000_000 else 2
+
+        print(f"Distinct counts ({total_rows} rows, {len(filtered_df)} filtered)")
+        if total_rows <= 2_000_000:
+            string_ids = filtered_df["id_contents"].map("{:032x}".format)
+            print(f"  nunique on string ids:     {best_of(lambda: string_ids.nunique(), repeat) * 1e3:8.1f} ms")
+        print(f"  nunique on codes:          {best_of(lambda: filtered_df['id_contents'].nunique(), repeat) * 1e3:8.1f} ms")
+        print(f"  code bitmap:               {best_of(lambda: ds.distinct_count(ds.id_codes(filtered_df['id_contents'])), repeat) * 1e3:8.1f} ms")
+
+        by = ["platform_contents", "result_comments"]
+        print(f"  groupby nunique:           {best_of(lambda: filtered_df.groupby(by=by, as_index=False, observed=True)['id_comments'].nunique(), repeat) * 1e3:8.1f} ms")
+        print(f"  grouped code count:        {best_of(lambda: ds.grouped_distinct_count(filtered_df, by, 'id_comments'), repeat) * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    total_rows = int(sys.argv[1]) if len(sys.argv) > 1 else data_generation.TOTAL_ROWS
+    df = data_generation.generate_data(total_rows)
+    loader_benchmark(df)
+    csv_benchmark(df)
+    local_snapshot_benchmark(df)
+    storage_benchmark()
+    report_export_benchmark(df)
+    partition_benchmark(df)
+    filter_benchmark(df)
+    backend_parity(df)
+    delta_benchmark(df)
+    distinct_benchmark()
@@ -0,0 +1,29 @@
+# Chart aggregations of app.py, shared by the backend benchmark and the backend parity tests
+
+
+# Cube, grouping columns and validity flags behind every chart aggregation in app.py
+chart_aggregations = {
+    "overview_platform": ("content_cube", ["platform_contents"], ("alert_contents", "result_contents")),
+    "overview_alert": ("content_cube", ["alert_contents"], ("alert_contents",)),
+    "overview_classification": ("content_cube", ["result_contents"], ("result_contents", "alert_contents")),
+    "kpi_platform": ("content_cube", ["platform_contents", "result_contents"], ("alert_contents", "result_contents")),
+    "radial_chart": ("content_cube", ["result_contents"], ("result_contents", "alert_contents")),
+    "horizontal_bar": ("content_cube", ["result_contents"], ("result_contents", "alert_contents")),
+    "bar_chart": ("content_cube", ["alert_contents", "platform_contents"], ("alert_contents",)),
+    "pie_chart": ("comment_cube", ["result_comments"], ("result_comments", "alert_comments")),
+}
+
+# Grouping columns, validity flags and month label of the charts that aggregate raw comment rows by month
+comment_month_aggregations = {
+    "line_chart": (["commentTime_comments", "platform_contents"], ("alert_comments",), lambda times: times.dt.strftime("%b %Y")),
+    "overview_comments": (["commentTime_comments", "result_comments"], ("alert_comments", "result_comments"), lambda times: times.dt.to_period("M").dt.to_timestamp()),
+}
+
+
+def month_rows(dataset, spec, columns, month_label):
+    rows = dataset.select(spec, columns)
+    return rows.assign(commentTime_comments=month_label(rows["commentTime_comments"]))
+
+
+if __name__ == "__main__":
+    print("Dashboard Chart Queries")
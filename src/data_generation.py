@@ -1,23 +1,27 @@
 # Importing Libraries
 import io, os
 import json
-import boto3
 import uuid
 import random
 import pandas as pd
 import pytz
 from datetime import *
 from dotenv import load_dotenv
+import data_schema
+import storage
 
 # Credentials
 load_dotenv()
 aws_region = "ap-south-1"
 aws_access_key_id = os.environ.get("aws_access_key_id")
 aws_secret_access_key = os.environ.get("aws_secret_access_key")
+storage_clients = storage.StorageClients(aws_region, aws_access_key_id, aws_secret_access_key, local_directory=os.environ.get("local_s3_dir"))
 
 # s3 Location
 s3_data_path = "s3://github-projects-resume/Chatstat-Plotly-Dashboard/data"
 dashboard_data_path = f"{s3_data_path}/dashboard/output.csv"
+dashboard_snapshot_path = f"{s3_data_path}/dashboard/output.parquet"
+dashboard_delta_path = f"{s3_data_path}/dashboard/delta/"
 
 # Data Parameters
 TOTAL_ROWS = 200000
@@ -26,39 +30,42 @@ TOTAL_ROWS = 200000
 start_date = datetime(2024, 1, 1)
 end_date = datetime.combine(datetime.now(tz=pytz.timezone("Asia/Kolkata")).date(), time(23, 59, 59, 999999))
 
-# Users
+# Users and children keep the same ids across runs, so delta partitions line up with the snapshot
+def stable_id(email):
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, email))
+
 users = [
     {
-        "id": str(uuid.uuid4()),
+        "id": stable_id("klubiniecki@chatstat.com"),
         "name": "Kris Lubiniecki",
         "email": "klubiniecki@chatstat.com",
         "plan": "AI Guardian",
         "children": [
-            {"id": str(uuid.uuid4()), "name": "Emma", "age": "Elementary", "gender": "Female", "email": "Emma@chatstat.com"},
-            {"id": str(uuid.uuid4()), "name": "Oliver", "age": "Middle", "gender": "Male", "email": "Oliver@chatstat.com"},
+            {"id": stable_id("Emma@chatstat.com"), "name": "Emma", "age": "Elementary", "gender": "Female", "email": "Emma@chatstat.com"},
+            {"id": stable_id("Oliver@chatstat.com"), "name": "Oliver", "age": "Middle", "gender": "Male", "email": "Oliver@chatstat.com"},
         ],
     },
     {
-        "id": str(uuid.uuid4()),
+        "id": stable_id("jaskeerat.nonu@chatstat.com"),
         "name": "Jaskeerat Singh",
         "email": "jaskeerat.nonu@chatstat.com",
         "plan": "Privacy Protector",
         "children": [
-            {"id": str(uuid.uuid4()), "name": "Naman", "age": "Middle", "gender": "Male", "email": "Naman@chatstat.com"},
-            {"id": str(uuid.uuid4()), "name": "Aparna", "age": "High", "gender": "Female", "email": "Aparna@chatstat.com"},
-            {"id": str(uuid.uuid4()), "name": "Kiran", "age": "Elementary", "gender": "Male", "email": "Kiran@chatstat.com"},
+            {"id": stable_id("Naman@chatstat.com"), "name": "Naman", "age": "Middle", "gender": "Male", "email": "Naman@chatstat.com"},
+            {"id": stable_id("Aparna@chatstat.com"), "name": "Aparna", "age": "High", "gender": "Female", "email": "Aparna@chatstat.com"},
+            {"id": stable_id("Kiran@chatstat.com"), "name": "Kiran", "age": "Elementary", "gender": "Male", "email": "Kiran@chatstat.com"},
         ],
     },
     {
-        "id": str(uuid.uuid4()),
+        "id": stable_id("j.teng@chatstat.com"),
         "name": "Teng",
         "email": "j.teng@chatstat.com",
         "plan": "Essential Safety",
         "children": [
-            {"id": str(uuid.uuid4()), "name": "Li Wei", "age": "High", "gender": "Male", "email": "Li.Wei@chatstat.com"},
-            {"id": str(uuid.uuid4()), "name": "Chen Jie", "age": "Middle", "gender": "Female", "email": "Chen.Jie@chatstat.com"},
-            {"id": str(uuid.uuid4()), "name": "Wang Fang", "age": "Elementary", "gender": "Female", "email": "Wang.Fang@chatstat.com"},
-            {"id": str(uuid.uuid4()), "name": "Zhang Wei", "age": "Middle", "gender": "Male", "email": "Zhang.Wei@chatstat.com"},
+            {"id": stable_id("Li.Wei@chatstat.com"), "name": "Li Wei", "age": "High", "gender": "Male", "email": "Li.Wei@chatstat.com"},
+            {"id": stable_id("Chen.Jie@chatstat.com"), "name": "Chen Jie", "age": "Middle", "gender": "Female", "email": "Chen.Jie@chatstat.com"},
+            {"id": stable_id("Wang.Fang@chatstat.com"), "name": "Wang Fang", "age": "Elementary", "gender": "Female", "email": "Wang.Fang@chatstat.com"},
+            {"id": stable_id("Zhang.Wei@chatstat.com"), "name": "Zhang Wei", "age": "Middle", "gender": "Male", "email": "Zhang.Wei@chatstat.com"},
         ],
     },
 ]
@@ -103,9 +110,26 @@ def realistic_username(child_name, parent_name):
     return f"{base}_{suffix}{random.randint(1,99)}".strip("_")
 
 def final_to_s3(df):
-    s3_client = boto3.client("s3", region_name=aws_region, aws_access_key_id=aws_access_key_id,
-                             aws_secret_access_key=aws_secret_access_key)
+    s3_client = storage_clients.s3()
+
+    # The snapshot replaces every row, so the delta partitions written before it are removed first,
+    # the dashboard also skips any written before the snapshot it loaded
+    bucket_name = dashboard_delta_path.split("/")[2]
+    prefix = "/".join(dashboard_delta_path.split("/")[3:])
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket_name, Prefix=prefix):
+        objects = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+        if objects:
+            s3_client.delete_objects(Bucket=bucket_name, Delete={"Objects": objects})
+
+    # Columnar snapshot with a fixed schema
+    bucket_name = dashboard_snapshot_path.split("/")[2]
+    key = "/".join(dashboard_snapshot_path.split("/")[3:])
 
+    buffer = io.BytesIO()
+    data_schema.apply_schema(df.copy()).to_parquet(buffer, index=False)
+    s3_client.put_object(Bucket=bucket_name, Key=key, Body=buffer.getvalue())
+
+    # Csv output kept as a fallback
     bucket_name = dashboard_data_path.split("/")[2]
     key = "/".join(dashboard_data_path.split("/")[3:])
 
@@ -115,10 +139,24 @@ def final_to_s3(df):
     return True
 
 
-def lambda_handler(event=None, context=None):
+def delta_to_s3(df, current_time):
+    s3_client = storage_clients.s3()
+
+    # New rows only, as a time stamped partition the dashboard merges into the snapshot it already holds
+    new_delta_path = dashboard_delta_path + "delta_{}.parquet".format(current_time.strftime('%Y_%m_%d_%H_%M_%S_%f'))
+    bucket_name = new_delta_path.split("/")[2]
+    key = "/".join(new_delta_path.split("/")[3:])
+
+    buffer = io.BytesIO()
+    data_schema.apply_schema(df.copy()).to_parquet(buffer, index=False)
+    s3_client.put_object(Bucket=bucket_name, Key=key, Body=buffer.getvalue())
+    return True
+
+
+def generate_data(total_rows=TOTAL_ROWS, start=start_date, end=end_date):
     rows = []
     for user in users:
-        count = user_distribution[user["email"]]
+        count = int(user_distribution[user["email"]] * total_rows / TOTAL_ROWS)
         for _ in range(count):
             child = random.choice(user["children"])
             platform = random.choice(platforms)
@@ -129,7 +167,7 @@ def lambda_handler(event=None, context=None):
             comment_id = str(uuid.uuid4())
 
             # Times
-            content_time = random_date(start_date, end_date)
+            content_time = random_date(start, end)
             comment_time = content_time + timedelta(minutes=random.randint(0, 1440))
 
             # Alerts & results
@@ -169,10 +207,20 @@ def lambda_handler(event=None, context=None):
             }
             rows.append(row)
 
-    # Writing to s3
     df = pd.DataFrame(rows)
     df = df.sample(frac=1, random_state=42).reset_index(drop=True)
-    final_to_s3(df)
+    return df
+
+
+def lambda_handler(event=None, context=None):
+    # Writing to s3, a full snapshot or with {"delta_rows": n} only the rows of the last hour as a delta partition
+    if event and event.get("delta_rows"):
+        current_time = datetime.now()
+        df = generate_data(event["delta_rows"], start=current_time - timedelta(hours=1), end=current_time)
+        delta_to_s3(df, current_time)
+    else:
+        df = generate_data()
+        final_to_s3(df)
 
     return {
         'statusCode': 200,
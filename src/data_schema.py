@@ -0,0 +1,117 @@
+# Importing Libraries
+import numpy as np
+import pandas as pd
+
+# Dashboard Snapshot Schema
+dashboard_columns = [
+    "id_users", "children_users", "name_users", "email_users", "plan_users",
+    "id_childrens", "accounts_childrens", "name_childrens", "email_childrens", "age_childrens", "gender_childrens", "user_childrens",
+    "id_accounts", "content_accounts", "username_accounts", "platform_accounts",
+    "id_contents", "comments_contents", "platform_contents", "createTime_contents", "alert_contents", "result_contents",
+    "id_comments", "commentTime_comments", "platform_comments", "alert_comments", "result_comments"
+]
+datetime_columns = ["createTime_contents", "commentTime_comments"]
+category_columns = [
+    "id_users", "children_users", "name_users", "email_users", "plan_users",
+    "id_childrens", "accounts_childrens", "name_childrens", "email_childrens", "age_childrens", "gender_childrens", "user_childrens",
+    "username_accounts", "platform_accounts", "comments_contents", "platform_contents", "alert_contents", "result_contents",
+    "platform_comments", "alert_comments", "result_comments"
+]
+string_columns = ["id_accounts", "content_accounts", "id_contents", "id_comments"]
+datetime_format = "%Y-%m-%d %H:%M:%S"
+
+# Strings read as missing values from csv, the same ones pandas.read_csv treats as missing
+null_values = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"]
+
+# Columns that repeat another column row for row
+duplicate_columns = {"platform_accounts": "platform_contents", "platform_comments": "platform_contents", "user_childrens": "id_users"}
+
+
+def apply_schema(df):
+    # Empty strings are read back as missing values from csv, so both formats agree on them
+    for column in df.columns:
+        if column in datetime_columns:
+            if not pd.api.types.is_datetime64_any_dtype(df[column]):
+                df[column] = pd.to_datetime(df[column], format=datetime_format)
+        elif column in category_columns:
+            if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].where(df[column] != "").astype("category")
+        elif column in string_columns:
+            df[column] = df[column].where(df[column] != "").astype(object)
+    return df
+
+
+def id_lookup(uniques):
+    # Dictionary positions sorted by a 64 bit hash of their value, so new values are found without hashing the whole dictionary again
+    hashes = pd.util.hash_array(np.asarray(uniques, dtype=object), categorize=False)
+    order = np.argsort(hashes, kind="stable")
+    return hashes[order], order
+
+
+def merge_lookups(lookups):
+    # Lookups of consecutive parts of a dictionary as a single one, the positions of every part already count from the start of the dictionary
+    hashes = np.concatenate([hashes for hashes, _ in lookups])
+    order = np.argsort(hashes, kind="stable")
+    return hashes[order], np.concatenate([positions for _, positions in lookups])[order]
+
+
+def dictionary_values(dictionary, positions):
+    # Values of an id dictionary held as a numpy array, or as an Arrow array mapped from a local snapshot
+    return np.asarray(dictionary.take(positions), dtype=object)
+
+
+def extend_ids(column, dictionary, lookup):
+    # Codes of a column in an existing dictionary, values it does not hold yet are appended to it
+    values = column.to_numpy(dtype=object)
+    hashes, positions = lookup
+    codes = np.full(len(values), -1, dtype="int64")
+    if len(hashes) and len(values):
+        value_hashes = pd.util.hash_array(values, categorize=False)
+        found = np.minimum(np.searchsorted(hashes, value_hashes), len(hashes) - 1)
+        candidates = positions[found]
+        matched = (hashes[found] == value_hashes) & (dictionary_values(dictionary, candidates) == values)
+        codes[matched] = candidates[matched]
+
+    unseen = (codes < 0) & column.notna().to_numpy()
+    new_codes, new_uniques = pd.factorize(values[unseen])
+    codes[unseen] = len(dictionary) + new_codes
+    new_uniques = np.asarray(new_uniques, dtype=object)
+    new_hashes, new_order = id_lookup(new_uniques)
+    inserted = np.searchsorted(hashes, new_hashes)
+    lookup = (np.insert(hashes, inserted, new_hashes), np.insert(positions, inserted, len(dictionary) + new_order))
+    return codes, np.concatenate([np.asarray(dictionary, dtype=object), new_uniques]), lookup
+
+
+def compact_frame(df, previous=None):
+    # Duplicated columns are stored once
+    df = df.drop(columns=[column for column, source in duplicate_columns.items() if (column in df.columns) and (source in df.columns)])
+
+    # High cardinality ids become int64 surrogate codes, the dictionary is kept to decode them
+    # With the attrs of a previous frame, its codes are kept and only unseen ids get new codes
+    id_dictionary, id_lookups = {}, {}
+    for column in string_columns:
+        if column in df.columns:
+            if (previous is not None) and (column in previous.get("id_dictionary", {})):
+                dictionary = previous["id_dictionary"][column]
+                # The lookup of a full load is only built by its first delta and kept with it
+                lookup = previous.setdefault("id_lookup", {}).get(column)
+                if lookup is None:
+                    lookup = previous["id_lookup"][column] = id_lookup(dictionary)
+                elif isinstance(lookup, list):
+                    # A snapshot with a delta segment maps the lookup of its base and of the ids the segment added
+                    lookup = previous["id_lookup"][column] = merge_lookups(lookup)
+                codes, id_dictionary[column], id_lookups[column] = extend_ids(df[column], dictionary, lookup)
+            else:
+                codes, uniques = pd.factorize(df[column])
+                id_dictionary[column] = np.asarray(uniques, dtype=object)
+            if (codes < 0).any():
+                df[column] = pd.Series(codes, index=df.index).where(codes >= 0).astype("Int64")
+            else:
+                df[column] = codes
+    df.attrs["id_dictionary"] = id_dictionary
+    df.attrs["id_lookup"] = id_lookups
+    return df
+
+
+if __name__ == "__main__":
+    print("Dashboard Data Schema")
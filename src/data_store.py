@@ -0,0 +1,1016 @@
+# Importing Libraries
+import os
+import copy
+import json
+import time
+import fcntl
+import shutil
+import tempfile
+import contextlib
+import threading
+import concurrent.futures
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from dataclasses import dataclass, replace
+import data_schema
+
+# Columns that are only counted when they hold an actual classification
+validity_columns = ["alert_contents", "result_contents", "alert_comments", "result_comments"]
+
+# Largest boolean bitmap (in cells) used to mark seen ids before falling back to a sorted unique
+bitmap_limit = 1 << 26
+
+
+def user_slices(emails):
+    # Row bounds of every run of equal emails in an already grouped column
+    emails = emails.astype("category")
+    codes = emails.cat.codes.to_numpy()
+    if len(codes) == 0:
+        return {}
+
+    breaks = np.flatnonzero(np.diff(codes)) + 1
+    starts = np.concatenate([[0], breaks])
+    stops = np.concatenate([breaks, [len(codes)]])
+    return {emails.cat.categories[codes[start]]: (start, stop) for start, stop in zip(starts, stops) if codes[start] >= 0}
+
+
+def validity_flag(column):
+    # Checked once per category instead of once per row, missing values take the trailing False
+    column = column.astype("category")
+    valid_categories = ~column.cat.categories.str.lower().isin(["no", ""])
+    return np.append(valid_categories, False)[column.cat.codes.to_numpy()]
+
+
+def id_codes(column):
+    # Surrogate id codes with missing ids as -1
+    return column.to_numpy(dtype="int64", na_value=-1)
+
+
+def key_codes(column, dropna=True):
+    # Sorted codes of a grouping column, missing values take the last code when they are kept
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes, uniques = column.cat.codes.to_numpy().astype("int64"), column.cat.categories
+    else:
+        codes, uniques = pd.factorize(column, sort=True)
+        codes = codes.astype("int64")
+    if not dropna:
+        codes = np.where(codes < 0, len(uniques), codes)
+    return codes, uniques
+
+
+def group_codes(dataframe, by, dropna=True):
+    # Every combination of key codes becomes a single integer group key, kept is False for rows dropped on a missing key
+    columns = [key_codes(dataframe[column], dropna) for column in by]
+    radices = [len(uniques) + (0 if dropna else 1) for _, uniques in columns]
+    keys = np.zeros(len(dataframe), dtype="int64")
+    kept = np.ones(len(dataframe), dtype=bool)
+    for (codes, _), radix in zip(columns, radices):
+        keys = keys * radix + np.maximum(codes, 0)
+        kept &= codes >= 0
+    return keys, kept, columns, radices
+
+
+def decode_groups(dataframe, by, columns, radices, group_keys):
+    # Group keys are decoded back to the original values, last column first
+    result = {}
+    remainder = group_keys
+    for column, (_, uniques), radix in reversed(list(zip(by, columns, radices))):
+        remainder, column_codes = np.divmod(remainder, radix)
+        column_codes = np.where(column_codes >= len(uniques), -1, column_codes)
+        if isinstance(dataframe[column].dtype, pd.CategoricalDtype):
+            result[column] = pd.Categorical.from_codes(column_codes, dtype=dataframe[column].dtype)
+        else:
+            result[column] = pd.Series(uniques.take(np.maximum(column_codes, 0))).where(column_codes >= 0)
+    return pd.DataFrame({column: result[column] for column in by})
+
+
+def count_groups(groups, group_count, ids):
+    # Exact number of distinct ids per group, ids are marked once per group in a bitmap or a sorted unique
+    counted = ids >= 0
+    groups, ids = groups[counted], ids[counted]
+    size = int(ids.max()) + 1 if len(ids) else 1
+    pairs = groups * size + ids
+    if group_count * size <= bitmap_limit:
+        seen = np.zeros(group_count * size, dtype=bool)
+        seen[pairs] = True
+        return np.count_nonzero(seen.reshape(group_count, size), axis=1)
+    return np.bincount(np.unique(pairs) // size, minlength=group_count)
+
+
+def distinct_count(codes):
+    # Exact number of distinct ids in a slice of surrogate codes
+    return int(count_groups(np.zeros(len(codes), dtype="int64"), 1, codes)[0])
+
+
+def grouped_distinct_count(dataframe, by, id_column, dropna=True):
+    # Same result as dataframe.groupby(by, as_index=False, observed=True, dropna=dropna)[id_column].nunique(), counted on the codes
+    keys, kept, columns, radices = group_codes(dataframe, by, dropna)
+    group_count = int(np.prod(radices, dtype=object))
+    if group_count >= 1 << 62:
+        return dataframe.groupby(by=by, as_index=False, observed=True, dropna=dropna)[id_column].nunique()
+
+    keys, ids = keys[kept], id_codes(dataframe[id_column])[kept]
+    if group_count <= bitmap_limit:
+        group_keys = np.flatnonzero(np.bincount(keys, minlength=group_count))
+    else:
+        group_keys = np.unique(keys)
+
+    result = decode_groups(dataframe, by, columns, radices, group_keys)
+    result[id_column] = count_groups(np.searchsorted(group_keys, keys), len(group_keys), ids).astype("int64")
+    return result
+
+
+def range_positions(starts, stops):
+    # Positions covered by a set of [start, stop) ranges, in order
+    lengths = stops - starts
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+
+def sketch_precision(error):
+    # HyperLogLog registers needed for a relative standard error of 1.04 / sqrt(registers)
+    return int(np.clip(np.ceil(np.log2((1.04 / error) ** 2)), 7, 16))
+
+
+def hash_ids(ids):
+    # splitmix64 finalizer, spreads the sequential surrogate codes over all 64 bits
+    values = ids.astype(np.uint64)
+    with np.errstate(over="ignore"):
+        values = values + np.uint64(0x9E3779B97F4A7C15)
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def bit_length(values):
+    # Number of significant bits of every uint64 value, 0 for 0
+    position = np.zeros(len(values), dtype=np.uint64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        candidate = position + np.uint64(shift)
+        position = np.where((values >> candidate) != 0, candidate, position)
+    return np.where(values != 0, position + np.uint64(1), np.uint64(0)).astype("int64")
+
+
+def build_sketches(groups, ids, precision):
+    # Sparse HyperLogLog sketch per group, the highest rank seen in every register that was hit
+    hashes = hash_ids(ids)
+    registers = (hashes >> np.uint64(64 - precision)).astype("int64")
+    ranks = (64 - precision) - bit_length(hashes & np.uint64((1 << (64 - precision)) - 1)) + 1
+
+    # Sorted on (group, register, rank), the last entry of every (group, register) run holds its maximum rank
+    entries = np.unique(((groups << precision) + registers) << 6 | ranks)
+    slots = entries >> 6
+    last = np.ones(len(slots), dtype=bool)
+    last[:-1] = slots[1:] != slots[:-1]
+    entries = entries[last]
+    return entries >> (precision + 6), ((entries >> 6) & ((1 << precision) - 1)).astype("uint16"), (entries & 63).astype("uint8")
+
+
+def merge_sketches(groups, group_count, registers, ranks, precision):
+    # Register wise maximum of all sketch entries of a group, written rank by rank so higher ranks overwrite lower ones
+    merged = np.zeros(group_count << precision, dtype="uint8")
+    slots = (groups << precision) + registers
+    order = np.argsort(ranks, kind="stable")
+    bounds = np.searchsorted(ranks[order], np.arange(66))
+    for rank in range(1, 65):
+        if bounds[rank + 1] > bounds[rank]:
+            merged[slots[order[bounds[rank]:bounds[rank + 1]]]] = rank
+    return merged.reshape(group_count, 1 << precision)
+
+
+def sigma(x):
+    # x + sum of x^(2^k) * 2^(k-1), infinite for x = 1
+    y, z = 1.0, x.copy()
+    for _ in range(64):
+        x = x * x
+        z = z + x * y
+        y = y + y
+    return z
+
+
+def tau(x):
+    # (1 - x - sum of (1 - x^(2^-k))^2 * 2^-k) / 3, zero at both ends
+    y, z = 1.0, 1 - x
+    for _ in range(64):
+        x = np.sqrt(x)
+        y = y * 0.5
+        z = z - (1 - x) ** 2 * y
+    return z / 3
+
+
+def estimate_sketches(merged, precision):
+    # Cardinality of every merged sketch from its register histogram, Ertl's estimator is unbiased over the whole range
+    size, top = 1 << precision, 64 - precision + 1
+    histogram = np.bincount((np.arange(len(merged))[:, None] * (top + 1) + merged).ravel(), minlength=len(merged) * (top + 1)).reshape(len(merged), top + 1)
+    with np.errstate(over="ignore", invalid="ignore"):
+        z = size * tau(1 - histogram[:, top] / size)
+        for rank in range(top - 1, 0, -1):
+            z = 0.5 * (z + histogram[:, rank])
+        z = z + size * sigma(histogram[:, 0] / size)
+    return np.rint(np.where(np.isinf(z), 0, size * size / (2 * np.log(2)) / z)).astype("int64")
+
+
+def time_slice(dataframe, column, start_time, end_time):
+    # Rows between start_time and end_time (both inclusive) of a frame ordered by column
+    times = dataframe[column].to_numpy()
+    start = np.searchsorted(times, pd.Timestamp(start_time).to_datetime64(), side="left")
+    stop = np.searchsorted(times, pd.Timestamp(end_time).to_datetime64(), side="right")
+    return dataframe.iloc[start:stop]
+
+
+# Reference aggregation backend, pandas group-bys and the code based distinct counts
+class PandasBackend:
+    name = "pandas"
+
+    def grouped_sum(self, dataframe, by, value_column):
+        return dataframe.groupby(by=by, as_index=False, observed=True)[value_column].sum()
+
+    def grouped_distinct_count(self, dataframe, by, id_column):
+        return grouped_distinct_count(dataframe, by, id_column)
+
+
+# Same aggregations as SQL on an in-process DuckDB, which scans the frame through Arrow on every core
+class DuckDBBackend:
+    name = "duckdb"
+
+    def __init__(self, threads=None):
+        import duckdb
+        self.connection = duckdb.connect(config={"threads": threads or os.cpu_count()})
+
+    def aggregate(self, dataframe, by, aggregate, value_column):
+        keys = ", ".join(f'"{column}"' for column in by)
+        kept = " AND ".join(f'"{column}" IS NOT NULL' for column in by)
+
+        # A cursor per call, so callback threads never share one
+        cursor = self.connection.cursor()
+        try:
+            cursor.register("frame", dataframe[by + [value_column]])
+            result = cursor.execute(f'SELECT {keys}, {aggregate} AS "{value_column}" FROM frame WHERE {kept} GROUP BY {keys} ORDER BY {keys}').df()
+        finally:
+            cursor.close()
+
+        # Results carry the pandas backend dtypes
+        for column in by:
+            if isinstance(dataframe[column].dtype, pd.CategoricalDtype):
+                result[column] = pd.Categorical(result[column], dtype=dataframe[column].dtype)
+        result[value_column] = result[value_column].astype("int64")
+        return result
+
+    def grouped_sum(self, dataframe, by, value_column):
+        return self.aggregate(dataframe, by, f'SUM("{value_column}")', value_column)
+
+    def grouped_distinct_count(self, dataframe, by, id_column):
+        return self.aggregate(dataframe, by, f'COUNT(DISTINCT "{id_column}")', id_column)
+
+
+backends = {"pandas": PandasBackend, "duckdb": DuckDBBackend}
+
+
+# Dashboard filter state, every field left as None keeps all rows
+@dataclass(frozen=True)
+class FilterSpec:
+    user: str = None
+    time_column: str = None
+    start_time: object = None
+    end_time: object = None
+    member: str = None
+    platform: str = None
+    alert: str = None
+    valid: tuple = ()
+
+    def narrow(self, **changes):
+        return replace(self, **changes)
+
+    def predicates(self):
+        return {column: value for column, value in [("name_childrens", self.member), ("platform_contents", self.platform), ("alert_contents", self.alert)] if value is not None}
+
+
+def equal_mask(column, value):
+    # Compared on the category codes, a value that is not a category matches nothing
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        code = column.cat.categories.get_indexer([value])[0]
+        if code < 0:
+            return np.zeros(len(column), dtype=bool)
+        return column.cat.codes.to_numpy() == code
+    return (column == value).to_numpy()
+
+
+def select(frame, bounds, spec, columns=None, order=None):
+    # Rows of a frame grouped by user and ordered by spec.time_column inside each user, answered in one pass:
+    # the user bounds and the time range narrow the rows by position, the remaining predicates are folded into a single mask
+    # and only the projected columns are taken
+    # With an order, the rows are read through those positions instead, which put each user's rows in spec.time_column order
+    start, stop = bounds
+    if spec.time_column is not None:
+        times = frame[spec.time_column].to_numpy()
+        times = times[start:stop] if order is None else times[order[start:stop]]
+        start_time = pd.Timestamp.min if spec.start_time is None else pd.Timestamp(spec.start_time)
+        end_time = pd.Timestamp.max if spec.end_time is None else pd.Timestamp(spec.end_time)
+        start, stop = start + np.searchsorted(times, start_time.to_datetime64(), side="left"), start + np.searchsorted(times, end_time.to_datetime64(), side="right")
+
+    rows = slice(start, stop) if order is None else order[start:stop]
+    mask = np.ones(stop - start, dtype=bool)
+    for column, value in spec.predicates().items():
+        mask &= equal_mask(frame[column].iloc[rows], value)
+    for column in spec.valid:
+        mask &= frame[f"valid_{column}"].to_numpy()[rows]
+
+    column_positions = slice(None) if columns is None else frame.columns.get_indexer(list(dict.fromkeys(columns)))
+    if order is not None:
+        return frame.iloc[rows if mask.all() else rows[mask], column_positions]
+    if mask.all():
+        return frame.iloc[start:stop, column_positions]
+    return frame.iloc[start + np.flatnonzero(mask), column_positions]
+
+
+def time_order(frame, time_column):
+    # Positions that order the rows of each user of a frame grouped by user by time_column, missing times last
+    return np.lexsort((frame[time_column].to_numpy(), key_codes(frame["email_users"], dropna=False)[0]))
+
+
+def sorted_codes(column):
+    # Category codes in the order sort_values leaves them, missing values last
+    codes = column.cat.codes.to_numpy().astype("int64")
+    return np.where(codes < 0, len(column.cat.categories), codes)
+
+
+def union_dtypes(frame, other):
+    # Categorical columns whose categories differ between two frames, with their sorted union like a single load would give
+    dtypes = {}
+    for column in frame.columns:
+        if (column in other.columns) and isinstance(frame[column].dtype, pd.CategoricalDtype) and isinstance(other[column].dtype, pd.CategoricalDtype):
+            if not frame[column].cat.categories.equals(other[column].cat.categories):
+                dtypes[column] = pd.CategoricalDtype(frame[column].cat.categories.union(other[column].cat.categories))
+    return dtypes
+
+
+def recode(frame, dtypes):
+    dtypes = {column: dtype for column, dtype in dtypes.items() if column in frame.columns}
+    return frame.astype(dtypes) if dtypes else frame
+
+
+def merge_sorted(frame, rows, keys):
+    # Rows merged into a frame grouped by a categorical key and ordered by a time key inside each group,
+    # each row goes after the equal rows of the frame, the order a stable sort of both frames would give
+    rows = rows.sort_values(by=keys, kind="stable", ignore_index=True)
+    group_key, time_key = keys
+    frame_codes, row_codes = sorted_codes(frame[group_key]), sorted_codes(rows[group_key])
+    frame_times, row_times = frame[time_key].to_numpy(), rows[time_key].to_numpy()
+
+    positions = np.empty(len(rows), dtype="int64")
+    breaks = np.flatnonzero(np.diff(row_codes)) + 1
+    for start, stop in zip(np.concatenate([[0], breaks]), np.concatenate([breaks, [len(rows)]])):
+        if start == stop:
+            continue
+        low, high = np.searchsorted(frame_codes, row_codes[start], side="left"), np.searchsorted(frame_codes, row_codes[start], side="right")
+        positions[start:stop] = low + np.searchsorted(frame_times[low:high], row_times[start:stop], side="right")
+
+    # The caller sets the attrs of the merged frame, pandas would otherwise compare the id dictionaries of both
+    frame = frame.copy(deep=False)
+    frame.attrs = rows.attrs = {}
+    order = np.insert(np.arange(len(frame)), positions, len(frame) + np.arange(len(rows)))
+    merged = pd.concat([frame, rows], ignore_index=True).take(order)
+    merged.index = pd.RangeIndex(len(merged))
+    return merged
+
+
+def cube_cells(df, time_column, id_column, dimensions):
+    # Distinct ids per user, day and dimension values
+    rows = df[["email_users", time_column, id_column] + dimensions].assign(day=df[time_column].dt.normalize())
+    cells = grouped_distinct_count(rows, ["email_users", "day"] + dimensions, id_column, dropna=False).rename(columns={id_column: "count"})
+    return rows, cells.assign(**{f"valid_{column}": validity_flag(cells[column]) for column in validity_columns if column in cells.columns})
+
+
+# Results shared by callbacks that fire on the same key, the first caller computes and the others wait on its future
+class SnapshotCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key, compute):
+        with self.lock:
+            future = self.entries.get(key)
+            owner = future is None
+            if owner:
+                future = concurrent.futures.Future()
+                self.entries[key] = future
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            else:
+                self.entries.move_to_end(key)
+
+        if owner:
+            try:
+                future.set_result(compute())
+            except Exception as error:
+                # A failed computation is not kept, the next caller tries again
+                with self.lock:
+                    if self.entries.get(key) is future:
+                        del self.entries[key]
+                future.set_exception(error)
+        return future.result()
+
+
+def replaced_cells(cells, replaced):
+    # Cells of the users and days in replaced, a (user, day) index of the cells a delta segment counted again
+    if (replaced is None) or (len(cells) == 0):
+        return np.zeros(len(cells), dtype=bool)
+    return pd.MultiIndex.from_frame(cells[["email_users", "day"]]).isin(replaced)
+
+
+def pack(cells, arrays, start, stop, offset):
+    # Cells whose [start, stop) ranges point at arrays from offset on, moved to ranges over arrays holding only their own entries
+    starts, stops = cells[start].to_numpy() - offset, cells[stop].to_numpy() - offset
+    lengths = stops - starts
+    ends = offset + np.cumsum(lengths)
+    positions = range_positions(starts, stops)
+    return cells.assign(**{start: ends - lengths, stop: ends}), [array[positions] for array in arrays]
+
+
+# Daily distinct counts per user and dimension values
+# A cube can carry delta cells on top of its own, they replace all of its cells of the users and days in replaced,
+# their id and sketch ranges go on past the cube's arrays into delta_arrays and dtypes recodes its cells to the categories of both
+class Cube:
+    delta_cells = None
+    delta_slices = {}
+    delta_arrays = {}
+    replaced = None
+    dtypes = {}
+
+    def __init__(self, df, time_column, id_column, dimensions, count_error=None, exact_count_limit=0, backend=None, keep_ids=False):
+        self.time_column = time_column
+        self.id_column = id_column
+        self.backend = backend or PandasBackend()
+        self.count_error = count_error
+        self.precision = None
+        self.exact_count_limit = exact_count_limit
+        self.dimensions = dimensions
+        self.snapshots = SnapshotCache()
+        keys = ["email_users", "day"] + dimensions
+        rows, cells = cube_cells(df, time_column, id_column, dimensions)
+        ids = id_codes(rows[id_column])
+        self.id_limit = int(ids.max()) + 1 if len(ids) else 0
+
+        # Cell counts only add up when every id falls in a single cell, otherwise the cells keep their ids
+        cell_totals = cells.groupby(by=["email_users"], observed=True)["count"].sum()
+        user_totals = grouped_distinct_count(rows, ["email_users"], id_column).set_index("email_users")[id_column]
+        self.exact = (not keep_ids) and cell_totals.astype("int64").equals(user_totals.astype("int64"))
+        if not self.exact:
+            # Distinct ids of every cell are stored in cell order, each cell points at its range
+            row_keys = group_codes(rows, keys, dropna=False)[0]
+            counted = ids >= 0
+            size = max(self.id_limit, 1)
+            pairs = np.unique(np.searchsorted(np.unique(row_keys), row_keys[counted]) * size + ids[counted])
+            cell_positions, self.ids = np.divmod(pairs, size)
+            bounds = np.searchsorted(cell_positions, np.arange(len(cells) + 1))
+            cells = cells.assign(id_start=bounds[:-1], id_stop=bounds[1:])
+
+            # Optional per day HyperLogLog sketches, merged over any range instead of counting every id
+            if count_error is not None:
+                self.precision = sketch_precision(count_error)
+                sketch_cells, self.registers, self.ranks = build_sketches(cell_positions, self.ids, self.precision)
+                bounds = np.searchsorted(sketch_cells, np.arange(len(cells) + 1))
+                cells = cells.assign(sketch_start=bounds[:-1], sketch_stop=bounds[1:])
+
+        self.cells = cells
+        self.user_slices = user_slices(self.cells["email_users"])
+        self.value_columns = [column for column in ["count", "id_start", "id_stop", "sketch_start", "sketch_stop"] if column in cells.columns]
+
+    def append(self, segments, rows, dtypes):
+        # Cube once rows were merged into the row segments, given as (frame, user slices) pairs, the cells of the users and days
+        # the rows fall on are counted again from every segment and become delta cells, every other cell stays as it is
+        # None when the cube has to be built again from all rows, for rows without a user or a time or an exact cube that stops being exact
+        if rows["email_users"].isna().any() or rows[self.time_column].isna().any():
+            return None
+
+        row_days = [(email, np.unique(days.dt.normalize().to_numpy())) for email, days in rows.groupby("email_users", observed=True)[self.time_column]]
+        parts = []
+        for df, df_slices in segments:
+            times = df[self.time_column].to_numpy()
+            starts, stops = [], []
+            for email, days in row_days:
+                start, stop = df_slices.get(email, (0, 0))
+                starts.append(start + np.searchsorted(times[start:stop], days, side="left"))
+                stops.append(start + np.searchsorted(times[start:stop], days + np.timedelta64(1, "D"), side="left"))
+            part = recode(df.iloc[range_positions(np.concatenate(starts), np.concatenate(stops))], dtypes)
+            part.attrs = {}
+            parts.append(part)
+        day_rows = pd.concat(parts, ignore_index=True)
+        day_cube = Cube(day_rows, self.time_column, self.id_column, self.dimensions, self.count_error, self.exact_count_limit, self.backend, keep_ids=not self.exact)
+
+        # Still exact when no id of those days counts in two of their cells, and every id seen before is already counted on those days
+        if self.exact:
+            exact = day_cube.exact
+            if exact:
+                size = max(self.id_limit, 1)
+                ids, row_ids = id_codes(day_rows[self.id_column]), id_codes(rows[self.id_column])
+                seen, row_seen = (ids >= 0) & (ids < self.id_limit), (row_ids >= 0) & (row_ids < self.id_limit)
+                day_keys, day_counts = np.unique(sorted_codes(day_rows["email_users"])[seen] * size + ids[seen], return_counts=True)
+                row_keys, row_counts = np.unique(sorted_codes(rows["email_users"])[row_seen] * size + row_ids[row_seen], return_counts=True)
+                exact = bool((day_counts[np.searchsorted(day_keys, row_keys)] > row_counts).all())
+            if not exact:
+                return None
+
+        # Delta cells of earlier days stay unless the rows fell on them again, their entries are packed ahead of those of the new days
+        day_cells = day_cube.cells
+        kept = None if self.delta_cells is None else recode(self.delta_cells, dtypes)
+        if kept is not None:
+            kept = kept[~replaced_cells(kept, pd.MultiIndex.from_frame(day_cells[["email_users", "day"]]))]
+        arrays = {}
+        for names, start, stop in [(["ids"], "id_start", "id_stop"), (["registers", "ranks"], "sketch_start", "sketch_stop")]:
+            if not hasattr(day_cube, names[0]):
+                continue
+            offset = len(getattr(self, names[0]))
+            packed = [np.empty(0, dtype=getattr(day_cube, name).dtype) for name in names]
+            if kept is not None:
+                kept, packed = pack(kept, [self.delta_arrays[name] for name in names], start, stop, offset)
+            shift = offset + len(packed[0])
+            day_cells = day_cells.assign(**{start: day_cells[start] + shift, stop: day_cells[stop] + shift})
+            arrays.update({name: np.concatenate([values, getattr(day_cube, name)]) for name, values in zip(names, packed)})
+
+        cube = copy.copy(self)
+        cube.snapshots = SnapshotCache()
+        cube.dtypes = dtypes
+        cube.delta_cells = day_cells if (kept is None) or kept.empty else merge_sorted(kept, day_cells, ["email_users", "day"])
+        cube.delta_slices = user_slices(cube.delta_cells["email_users"])
+        cube.delta_arrays = arrays
+        cube.replaced = pd.MultiIndex.from_frame(cube.delta_cells[["email_users", "day"]]).unique()
+        row_ids = id_codes(rows[self.id_column])
+        cube.id_limit = max(self.id_limit, int(row_ids.max()) + 1 if len(row_ids) else 0)
+        return cube
+
+    def user_frame(self, email):
+        return self.select(FilterSpec(user=email))
+
+    def select(self, spec, columns=None):
+        # Cells are ordered by day inside each user, the columns needed for counting are always projected
+        # The delta cells are merged in by user and day in place of the cells they replace
+        bounds = (0, len(self.cells)) if spec.user is None else self.user_slices.get(spec.user, (0, 0))
+        columns = None if columns is None else list(columns) + self.value_columns
+        if self.delta_cells is None:
+            return select(self.cells, bounds, spec, columns)
+
+        projected = None if columns is None else columns + ["email_users", "day"]
+        cells = recode(select(self.cells, bounds, spec, projected), self.dtypes)
+        cells = cells[~replaced_cells(cells, self.replaced)]
+        bounds = (0, len(self.delta_cells)) if spec.user is None else self.delta_slices.get(spec.user, (0, 0))
+        delta_cells = select(self.delta_cells, bounds, spec, projected)
+        if not delta_cells.empty:
+            cells = delta_cells if cells.empty else merge_sorted(cells, delta_cells, ["email_users", "day"])
+        return cells if columns is None else cells[list(dict.fromkeys(columns))]
+
+    def rollup(self, cells):
+        # Summed cells only depend on the chart dimensions, so days and members collapse into a few rows
+        if not self.exact:
+            return cells
+        dimensions = [column for column in self.dimensions if column != "name_childrens"]
+        cells = cells.groupby(by=dimensions, as_index=False, observed=True, dropna=False)["count"].sum()
+        return cells.assign(**{f"valid_{column}": validity_flag(cells[column]) for column in validity_columns if column in cells.columns})
+
+    def select_shared(self, spec, columns=None):
+        # User, time range and member are answered once per filter state and shared by the sibling callbacks,
+        # the remaining predicates are a mask over the shared rollup
+        shared_spec = FilterSpec(user=spec.user, time_column=spec.time_column, start_time=spec.start_time, end_time=spec.end_time, member=spec.member)
+        cells = self.snapshots.get(shared_spec, lambda: self.rollup(self.select(shared_spec)))
+        remaining_spec = FilterSpec(platform=spec.platform, alert=spec.alert, valid=spec.valid)
+        return select(cells, (0, len(cells)), remaining_spec, None if columns is None else list(columns) + self.value_columns)
+
+    def values(self, array, positions):
+        # Entries of one of the cube's arrays, positions past its end are those of the delta cells
+        values = getattr(self, array)
+        if array not in self.delta_arrays:
+            return values[positions]
+        inside = positions < len(values)
+        result = np.empty(len(positions), dtype=values.dtype)
+        result[inside] = values[positions[inside]]
+        result[~inside] = self.delta_arrays[array][positions[~inside] - len(values)]
+        return result
+
+    def distinct_counts(self, cells, groups, group_count):
+        # Distinct ids per group of cells, exact while the range holds few ids, merged from the sketches otherwise
+        starts, stops = cells["id_start"].to_numpy(), cells["id_stop"].to_numpy()
+        if (self.precision is None) or ((stops - starts).sum() <= self.exact_count_limit):
+            return count_groups(np.repeat(groups, stops - starts), group_count, self.values("ids", range_positions(starts, stops)))
+
+        starts, stops = cells["sketch_start"].to_numpy(), cells["sketch_stop"].to_numpy()
+        positions = range_positions(starts, stops)
+        merged = merge_sketches(np.repeat(groups, stops - starts), group_count, self.values("registers", positions).astype("int64"), self.values("ranks", positions), self.precision)
+        return estimate_sketches(merged, self.precision)
+
+    def counts(self, cells, by):
+        if self.exact:
+            return self.backend.grouped_sum(cells, by, "count")
+        keys, kept, columns, radices = group_codes(cells, by)
+        group_keys, groups = np.unique(keys[kept], return_inverse=True)
+        result = decode_groups(cells, by, columns, radices, group_keys)
+        result["count"] = self.distinct_counts(cells[kept], groups, len(group_keys)).astype("int64")
+        return result
+
+    def total(self, cells):
+        if self.exact:
+            return cells["count"].sum()
+        return int(self.distinct_counts(cells, np.zeros(len(cells), dtype="int64"), 1)[0])
+
+    def period_counts(self, cells, period):
+        if self.exact:
+            return cells.groupby(by="day")["count"].sum().resample(period).sum()
+        periods = cells.groupby(pd.Grouper(key="day", freq=period))
+        index = periods["count"].sum().index
+        return pd.Series(self.distinct_counts(cells, periods.ngroup().to_numpy(), len(index)), index=index, name=self.id_column)
+
+
+# Rows grouped by user and ordered by content time inside each user, with a per user index
+# comment_order holds the positions that order them by comment time instead of a second sorted copy of the frame
+class Rows:
+    def __init__(self, df, comment_order=None):
+        self.df = df
+        self.comment_order = time_order(df, "commentTime_comments") if comment_order is None else comment_order
+        self.user_slices = user_slices(df["email_users"])
+
+    def user_frame(self, email):
+        return self.select(FilterSpec(user=email))
+
+    def select(self, spec, columns=None):
+        # Comment time ranges are cut through the comment time order
+        order = self.comment_order if spec.time_column == "commentTime_comments" else None
+        bounds = (0, len(self.df)) if spec.user is None else self.user_slices.get(spec.user, (0, 0))
+        return select(self.df, bounds, spec, columns, order)
+
+
+# Share of the base rows a delta segment can grow to before it is folded into a new base
+delta_fraction = 0.25
+
+
+# Dashboard Data, the rows of a full load with the rows of the delta partitions merged since kept apart in a delta segment,
+# so merging a partition only touches that segment, and a snapshot of the dataset only writes it next to the base already on disk
+# dtypes recodes the base rows to the categories of both, base_name is the snapshot directory holding the base when there is one
+class Dataset(Rows):
+    delta = None
+    dtypes = {}
+    base_name = None
+
+    def __init__(self, df, count_error=None, exact_count_limit=0, backend=None):
+        self.backend = backend or PandasBackend()
+        df = df.assign(**{f"valid_{column}": validity_flag(df[column]) for column in validity_columns if column in df.columns})
+        super().__init__(df.sort_values(by=["email_users", "createTime_contents"], kind="stable", ignore_index=True))
+
+        # Cubes answering the dashboard charts, contents by content alert and result, comments by comment alert and result
+        self.content_cube = Cube(self.df, "createTime_contents", "id_contents", ["name_childrens", "platform_contents", "alert_contents", "result_contents"], count_error, exact_count_limit, self.backend)
+        self.comment_cube = Cube(self.df, "createTime_contents", "id_comments", ["name_childrens", "platform_contents", "alert_contents", "alert_comments", "result_comments"], count_error, exact_count_limit, self.backend)
+
+        # Delta partitions already merged into the dataset
+        self.partitions = frozenset()
+
+    def append(self, rows, partitions=()):
+        # Dataset with the rows of new delta partitions merged into its delta segment, the base rows and cells are left as they are
+        # and the cubes only count the users and days the rows touch again, the current dataset is left as it is
+        rows = data_schema.compact_frame(rows, self.df.attrs)
+        rows = recode(rows, union_dtypes(self.df if self.delta is None else self.delta.df, rows))
+        rows = rows.assign(**{f"valid_{column}": validity_flag(rows[column]) for column in validity_columns if column in rows.columns})
+        if self.delta is None:
+            delta_df = rows.sort_values(by=["email_users", "createTime_contents"], kind="stable", ignore_index=True)
+        else:
+            delta_df = merge_sorted(recode(self.delta.df, union_dtypes(self.delta.df, rows)), rows, ["email_users", "createTime_contents"])
+        delta_df.attrs = rows.attrs
+
+        dataset = copy.copy(self)
+        dataset.df = self.df.copy(deep=False)
+        dataset.df.attrs = rows.attrs
+        dataset.delta = Rows(delta_df)
+        dataset.dtypes = union_dtypes(self.df, delta_df)
+        dataset.partitions = self.partitions | frozenset(partitions)
+        if len(delta_df) > delta_fraction * len(self.df):
+            return dataset.fold()
+
+        segments = [(self.df, self.user_slices), (delta_df, dataset.delta.user_slices)]
+        content_cube = self.content_cube.append(segments, rows, dataset.dtypes)
+        comment_cube = self.comment_cube.append(segments, rows, dataset.dtypes)
+        if (content_cube is None) or (comment_cube is None):
+            return dataset.fold()
+        dataset.content_cube, dataset.comment_cube = content_cube, comment_cube
+        return dataset
+
+    def fold(self):
+        # Dataset with the delta segment merged into the base rows and the cubes built again from all of them
+        if self.delta is None:
+            return self
+        df = merge_sorted(recode(self.df, self.dtypes), self.delta.df, ["email_users", "createTime_contents"])
+        df.attrs = self.df.attrs
+        dataset = Dataset(df, self.content_cube.count_error, self.content_cube.exact_count_limit, self.backend)
+        dataset.partitions = self.partitions
+        return dataset
+
+    def select(self, spec, columns=None):
+        # Rows of the delta segment are merged in by user and time, after the equal base rows like a single frame would hold them
+        if self.delta is None:
+            return super().select(spec, columns)
+        keys = ["email_users", "commentTime_comments" if spec.time_column == "commentTime_comments" else "createTime_contents"]
+        projected = None if columns is None else list(columns) + keys
+        rows = recode(super().select(spec, projected), self.dtypes)
+        delta_rows = self.delta.select(spec, projected)
+        if not delta_rows.empty:
+            rows = delta_rows if rows.empty else merge_sorted(rows, delta_rows, keys)
+        return rows if columns is None else rows[list(dict.fromkeys(columns))]
+
+
+def write_frame(path, name, frame):
+    # Every column of a frame in its own .npy file, categoricals as their codes and masked arrays as their values and mask
+    columns = []
+    for position, column in enumerate(frame.columns):
+        prefix = os.path.join(path, f"{name}.{position}")
+        dtype = frame[column].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            np.save(f"{prefix}.npy", frame[column].cat.codes.to_numpy())
+            columns.append({"name": column, "kind": "categorical", "categories": dtype.categories.tolist()})
+        elif pd.api.types.is_extension_array_dtype(dtype):
+            np.save(f"{prefix}.npy", frame[column].to_numpy(dtype=dtype.numpy_dtype, na_value=0))
+            np.save(f"{prefix}.mask.npy", frame[column].isna().to_numpy())
+            columns.append({"name": column, "kind": "masked", "dtype": dtype.name})
+        elif dtype == object:
+            np.save(f"{prefix}.npy", frame[column].to_numpy(), allow_pickle=True)
+            columns.append({"name": column, "kind": "object"})
+        else:
+            np.save(f"{prefix}.npy", frame[column].to_numpy())
+            columns.append({"name": column, "kind": "array"})
+    return columns
+
+
+def read_frame(path, name, columns):
+    # Columns are mapped read only and wrapped without a copy, so the pages are shared by every process mapping the same files
+    data = {}
+    for position, column in enumerate(columns):
+        prefix = os.path.join(path, f"{name}.{position}")
+        if column["kind"] == "object":
+            data[column["name"]] = np.load(f"{prefix}.npy", allow_pickle=True)
+            continue
+        values = np.asarray(np.load(f"{prefix}.npy", mmap_mode="r"))
+        if column["kind"] == "categorical":
+            values = pd.Categorical.from_codes(values, dtype=pd.CategoricalDtype(column["categories"]))
+        elif column["kind"] == "masked":
+            values = pd.api.types.pandas_dtype(column["dtype"]).construct_array_type()(values, np.asarray(np.load(f"{prefix}.mask.npy", mmap_mode="r")))
+        data[column["name"]] = values
+    return pd.DataFrame(data, copy=False)
+
+
+# Built dataset published on local disk, with its frames, cubes and id dictionaries mapped read only by every process on the host
+# current.json names the published snapshot, a new one is written next to it and replaces it in a single rename
+# A dataset with a delta segment is published as a segment snapshot that names its base snapshot, which stays in place,
+# so merging a partition only writes the delta rows, cells and new ids and every process keeps sharing the pages of the base
+class LocalSnapshot:
+    cube_attributes = ["time_column", "id_column", "count_error", "precision", "exact_count_limit", "dimensions", "id_limit", "exact", "value_columns"]
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @contextlib.contextmanager
+    def lock(self, name="publish.lock", operation=fcntl.LOCK_EX):
+        # Publishing is exclusive across processes, readers hold read.lock shared while they map files so they are not removed underneath
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name), "a") as lock_file:
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def current(self):
+        # Version and merged delta partitions of the published snapshot, None before the first one
+        try:
+            with open(os.path.join(self.directory, "current.json")) as current_file:
+                return json.load(current_file)
+        except FileNotFoundError:
+            return None
+
+    def metadata(self, name):
+        with open(os.path.join(self.directory, name, "snapshot.json")) as metadata_file:
+            return json.load(metadata_file)
+
+    def base_metadata(self, name):
+        # Metadata of a base snapshot still on disk that segments can be written on, an empty dict otherwise
+        try:
+            return self.metadata(name)
+        except FileNotFoundError:
+            return {}
+
+    def read(self, version, backend=None):
+        # Dataset of the published snapshot when it holds that version, None otherwise
+        with self.lock("read.lock", fcntl.LOCK_SH):
+            current = self.current()
+            if (current is None) or (current["version"] != version):
+                return None
+            metadata = self.metadata(current["name"])
+            base_name = metadata.get("base", current["name"])
+            dataset = self.read_base(base_name, backend)
+            dataset.partitions = frozenset(metadata["partitions"])
+            if "base" in metadata:
+                self.read_segment(current["name"], metadata, dataset)
+        return dataset
+
+    def read_base(self, name, backend=None):
+        path = os.path.join(self.directory, name)
+        metadata = self.metadata(name)
+        dataset = Dataset.__new__(Dataset)
+        dataset.backend = backend or PandasBackend()
+        dataset.base_name = name
+        Rows.__init__(dataset, read_frame(path, "df", metadata["frames"]["df"]), np.asarray(np.load(os.path.join(path, "comment_order.npy"), mmap_mode="r")))
+        attrs = {"id_dictionary": {}, "id_lookup": {}}
+        for column in metadata["id_columns"]:
+            attrs["id_dictionary"][column] = feather.read_table(os.path.join(path, f"ids.{column}.arrow"), memory_map=True).column(0).chunk(0)
+            attrs["id_lookup"][column] = tuple(np.asarray(np.load(os.path.join(path, f"ids.{column}.{part}.npy"), mmap_mode="r")) for part in ["hashes", "positions"])
+        dataset.df.attrs = attrs
+
+        for cube_name in ["content_cube", "comment_cube"]:
+            cube = Cube.__new__(Cube)
+            cube.__dict__.update(metadata["cubes"][cube_name]["attributes"])
+            cube.backend = dataset.backend
+            cube.snapshots = SnapshotCache()
+            cube.cells = read_frame(path, cube_name, metadata["frames"][cube_name])
+            cube.user_slices = user_slices(cube.cells["email_users"])
+            for array in metadata["cubes"][cube_name]["arrays"]:
+                setattr(cube, array, np.asarray(np.load(os.path.join(path, f"{cube_name}.{array}.npy"), mmap_mode="r")))
+            setattr(dataset, cube_name, cube)
+        return dataset
+
+    def read_segment(self, name, metadata, dataset):
+        # The id dictionaries go on with the ids the segment added, its lookup is only merged with the base one when a delta needs it
+        path = os.path.join(self.directory, name)
+        dataset.delta = Rows(read_frame(path, "delta", metadata["frames"]["delta"]), np.asarray(np.load(os.path.join(path, "delta.comment_order.npy"), mmap_mode="r")))
+        dataset.dtypes = {column: pd.CategoricalDtype(categories) for column, categories in metadata["dtypes"].items()}
+        attrs = {"id_dictionary": {}, "id_lookup": {}}
+        for column in metadata["id_columns"]:
+            added = feather.read_table(os.path.join(path, f"ids.{column}.arrow"), memory_map=True).column(0)
+            attrs["id_dictionary"][column] = pa.chunked_array([dataset.df.attrs["id_dictionary"][column]] + added.chunks, type=pa.string())
+            lookup = tuple(np.asarray(np.load(os.path.join(path, f"ids.{column}.{part}.npy"), mmap_mode="r")) for part in ["hashes", "positions"])
+            attrs["id_lookup"][column] = [dataset.df.attrs["id_lookup"][column], lookup]
+        dataset.df.attrs = dataset.delta.df.attrs = attrs
+
+        for cube_name in ["content_cube", "comment_cube"]:
+            cube = getattr(dataset, cube_name)
+            cube.__dict__.update(metadata["cubes"][cube_name]["attributes"])
+            cube.dtypes = dataset.dtypes
+            cube.delta_cells = read_frame(path, cube_name, metadata["frames"][cube_name])
+            cube.delta_slices = user_slices(cube.delta_cells["email_users"])
+            cube.delta_arrays = {array: np.asarray(np.load(os.path.join(path, f"{cube_name}.{array}.npy"), mmap_mode="r")) for array in metadata["cubes"][cube_name]["arrays"]}
+            cube.replaced = pd.MultiIndex.from_frame(cube.delta_cells[["email_users", "day"]]).unique()
+
+    def write(self, version, dataset):
+        # Only the delta segment is written when its base is already on disk, then it is published and older snapshots are removed
+        os.makedirs(self.directory, exist_ok=True)
+        base_name = dataset.base_name
+        if (base_name is None) or ("id_counts" not in self.base_metadata(base_name)):
+            base_name = self.write_base(version, dataset)
+        name = base_name if dataset.delta is None else self.write_segment(version, dataset, base_name)
+
+        current_path = os.path.join(self.directory, "current.json")
+        with open(f"{current_path}.tmp", "w") as current_file:
+            json.dump({"name": name, "version": version, "partitions": sorted(dataset.partitions)}, current_file)
+        os.replace(f"{current_path}.tmp", current_path)
+
+        # Processes that already mapped an older snapshot keep its files until they drop it
+        with self.lock("read.lock", fcntl.LOCK_EX):
+            for entry in os.listdir(self.directory):
+                if entry.startswith("snapshot-") and (entry not in (name, base_name)):
+                    shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+
+    def write_snapshot(self, metadata, write):
+        # Written into a staging directory that is renamed once complete
+        staging = tempfile.mkdtemp(dir=self.directory, prefix=".staging-")
+        name = f"snapshot-{time.time_ns()}"
+        try:
+            write(staging)
+            with open(os.path.join(staging, "snapshot.json"), "w") as metadata_file:
+                json.dump(metadata, metadata_file)
+            os.rename(staging, os.path.join(self.directory, name))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return name
+
+    def write_ids(self, path, column, values, lookup, offset=0):
+        if isinstance(values, pa.ChunkedArray):
+            values = values.combine_chunks()
+        values = values if isinstance(values, pa.Array) else pa.array(values, type=pa.string())
+        feather.write_feather(pa.table({column: values}), os.path.join(path, f"ids.{column}.arrow"), compression="uncompressed", chunksize=max(len(values), 1))
+        if lookup is None:
+            hashes, positions = data_schema.id_lookup(values)
+            lookup = (hashes, positions + offset)
+        elif isinstance(lookup, list):
+            lookup = data_schema.merge_lookups(lookup)
+        for part, array in zip(["hashes", "positions"], lookup):
+            np.save(os.path.join(path, f"ids.{column}.{part}.npy"), array)
+
+    def write_base(self, version, dataset):
+        # Base rows and cells with the whole id dictionaries, id_counts is where the ids of its segments start
+        id_dictionary = dataset.df.attrs.get("id_dictionary", {})
+        metadata = {"version": version, "partitions": sorted(dataset.partitions), "frames": {}, "cubes": {}, "id_columns": list(id_dictionary),
+                    "id_counts": {column: len(values) for column, values in id_dictionary.items()}}
+
+        def write(path):
+            metadata["frames"]["df"] = write_frame(path, "df", dataset.df)
+            np.save(os.path.join(path, "comment_order.npy"), dataset.comment_order)
+            for column, values in id_dictionary.items():
+                self.write_ids(path, column, values, dataset.df.attrs.get("id_lookup", {}).get(column))
+            for cube_name in ["content_cube", "comment_cube"]:
+                cube = getattr(dataset, cube_name)
+                metadata["frames"][cube_name] = write_frame(path, cube_name, cube.cells)
+                arrays = [array for array in ["ids", "registers", "ranks"] if hasattr(cube, array)]
+                for array in arrays:
+                    np.save(os.path.join(path, f"{cube_name}.{array}.npy"), getattr(cube, array))
+                metadata["cubes"][cube_name] = {"attributes": {attribute: getattr(cube, attribute) for attribute in self.cube_attributes}, "arrays": arrays}
+
+        return self.write_snapshot(metadata, write)
+
+    def write_segment(self, version, dataset, base_name):
+        # Delta rows and cells with the ids added since the base
+        id_dictionary = dataset.df.attrs.get("id_dictionary", {})
+        id_counts = self.metadata(base_name)["id_counts"]
+        metadata = {"base": base_name, "version": version, "partitions": sorted(dataset.partitions), "frames": {}, "cubes": {}, "id_columns": list(id_dictionary),
+                    "dtypes": {column: dtype.categories.tolist() for column, dtype in dataset.dtypes.items()}}
+
+        def write(path):
+            metadata["frames"]["delta"] = write_frame(path, "delta", dataset.delta.df)
+            np.save(os.path.join(path, "delta.comment_order.npy"), dataset.delta.comment_order)
+            for column, values in id_dictionary.items():
+                count = id_counts[column]
+                self.write_ids(path, column, values.slice(count) if isinstance(values, (pa.Array, pa.ChunkedArray)) else values[count:], None, count)
+            for cube_name in ["content_cube", "comment_cube"]:
+                cube = getattr(dataset, cube_name)
+                metadata["frames"][cube_name] = write_frame(path, cube_name, cube.delta_cells)
+                for array, values in cube.delta_arrays.items():
+                    np.save(os.path.join(path, f"{cube_name}.{array}.npy"), values)
+                metadata["cubes"][cube_name] = {"attributes": {attribute: getattr(cube, attribute) for attribute in self.cube_attributes}, "arrays": list(cube.delta_arrays)}
+
+        return self.write_snapshot(metadata, write)
+
+
+class StaleVersion(Exception):
+    pass
+
+
+# Current dataset of the process, loaded by a single caller and then refreshed in the background while the previous one keeps being served
+# With a probe, the source version is checked every refresh_interval and the dataset is only reloaded (load is given the version)
+# when that version changed, while it stays the same an update can bring the current dataset forward instead, such as merging newly written delta partitions
+# load and update raise StaleVersion when the source has already moved past the version they were given
+class DatasetHolder:
+    def __init__(self, load, refresh_interval, retry_interval=300, probe=None, update=None):
+        self.load = load
+        self.update = update
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.probe = probe
+        self.lock = threading.Lock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.dataset = None
+        self.version = None
+        self.next_refresh = 0
+        self.refreshing = None
+
+    def get(self):
+        dataset = self.dataset
+        if dataset is None:
+            return self.refresh().result()
+        if time.monotonic() >= self.next_refresh:
+            self.refresh()
+        return dataset
+
+    def refresh(self):
+        # At most one load runs at a time, every caller in the meantime gets the same future
+        with self.lock:
+            if self.refreshing is None:
+                self.refreshing = self.executor.submit(self.reload)
+            return self.refreshing
+
+    def reload(self, attempts=3):
+        try:
+            for attempt in range(attempts):
+                version = self.probe() if self.probe is not None else None
+                try:
+                    if (self.dataset is not None) and (version is not None) and (version == self.version):
+                        if self.update is not None:
+                            self.dataset = self.update(self.dataset)
+                        self.next_refresh = time.monotonic() + self.refresh_interval
+                        return self.dataset
+
+                    dataset = self.load(version)
+                except StaleVersion:
+                    # The source moved past the probed version while it loaded, it is probed again right away
+                    if attempt == attempts - 1:
+                        raise
+                    continue
+                # The new dataset replaces the old one in a single assignment, callers hold on to whichever one they already read
+                self.dataset, self.version = dataset, version
+                self.next_refresh = time.monotonic() + self.refresh_interval
+                return dataset
+        except Exception:
+            self.next_refresh = time.monotonic() + self.retry_interval
+            raise
+        finally:
+            with self.lock:
+                self.refreshing = None
+
+if __name__ == "__main__":
+    print("Dashboard Data Store")
@@ -0,0 +1,75 @@
+# Importing Libraries
+import uuid
+import threading
+import concurrent.futures
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+# Jobs run on a bounded pool of threads in the worker that accepted them, their state is kept in the shared cache,
+# so whichever worker answers a poll or a cancellation sees it
+# A job is given a progress function to call as it goes, it raises JobCancelled once the job is cancelled
+class JobQueue:
+    def __init__(self, result_cache, max_workers=2, max_queued=8, namespace="jobs"):
+        self.result_cache = result_cache
+        self.namespace = namespace
+        self.max_queued = max_queued
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.lock = threading.Lock()
+        self.futures = {}
+
+    def set_state(self, job_id, status, progress=0, result=None, error=None):
+        self.result_cache.set(self.namespace, ["job", job_id], {"status": status, "progress": progress, "result": result, "error": error})
+
+    def status(self, job_id):
+        # Status, progress from 0 to 1, result and error of a job, None once it is no longer kept
+        return self.result_cache.peek(self.namespace, ["job", job_id])
+
+    def cancelled(self, job_id):
+        return self.result_cache.peek(self.namespace, ["cancel", job_id]) is not None
+
+    def submit(self, function, *args):
+        # Jobs waiting or running in this worker are capped, past that QueueFull is raised rather than queueing more
+        with self.lock:
+            if len(self.futures) >= self.max_queued:
+                raise QueueFull(f"{len(self.futures)} jobs are already queued")
+            job_id = uuid.uuid4().hex
+            self.set_state(job_id, "queued")
+            self.futures[job_id] = self.executor.submit(self.run, job_id, function, args)
+        return job_id
+
+    def run(self, job_id, function, args):
+        def progress(fraction):
+            if self.cancelled(job_id):
+                raise JobCancelled(job_id)
+            self.set_state(job_id, "running", fraction)
+
+        try:
+            progress(0)
+            self.set_state(job_id, "done", 1, result=function(progress, *args))
+        except JobCancelled:
+            self.set_state(job_id, "cancelled")
+        except Exception as error:
+            self.set_state(job_id, "failed", error=str(error))
+        finally:
+            with self.lock:
+                self.futures.pop(job_id, None)
+
+    def cancel(self, job_id):
+        # Marked for every worker, a queued job is dropped before it starts and a running one stops at its next progress call
+        self.result_cache.set(self.namespace, ["cancel", job_id], True)
+        with self.lock:
+            future = self.futures.get(job_id)
+            if (future is not None) and future.cancel():
+                del self.futures[job_id]
+                self.set_state(job_id, "cancelled")
+
+
+if __name__ == "__main__":
+    print("Background Job Queue")
@@ -1,15 +1,24 @@
 # Importing Libraries
-import os, io
+import os, io, time
+import hashlib
 import json
-import boto3
-import s3fs
 import pandas as pd
+from pandas.api.types import union_categoricals
 import numpy as np
-import matplotlib.pyplot as plt
-from datetime import datetime
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from matplotlib.figure import Figure
+from openpyxl import Workbook
+from datetime import datetime, timezone
 from faker import Faker
 import pyshorteners
 from dotenv import load_dotenv
+import data_schema
+import data_store
+import shared_cache
+import storage
+import report_index
+import job_queue
 
 # Credentials
 load_dotenv()
@@ -17,38 +26,185 @@ aws_region = "ap-south-1"
 aws_access_key_id = os.environ.get("aws_access_key_id")
 aws_secret_access_key = os.environ.get("aws_secret_access_key")
 
-session = boto3.session.Session(region_name=aws_region, aws_access_key_id=os.environ.get("aws_access_key_id"),
-                                    aws_secret_access_key=os.environ.get("aws_secret_access_key"))
+# One s3 client per process shared by every call, with a pool of keep-alive connections and retries with backoff
+# local_s3_dir set to a directory answers the same calls from local files, one directory per bucket
+storage_clients = storage.StorageClients(aws_region, aws_access_key_id, aws_secret_access_key, local_directory=os.environ.get("local_s3_dir"),
+                                         pool_size=int(os.environ.get("s3_pool_size", 32)), max_attempts=int(os.environ.get("s3_max_attempts", 5)),
+                                         retry_mode=os.environ.get("s3_retry_mode", "adaptive"))
 
 # s3 Location
 s3_data_path = "s3://github-projects-resume/Chatstat-Plotly-Dashboard/data"
 dashboard_data_path = f"{s3_data_path}/dashboard/output.csv"
+dashboard_snapshot_path = f"{s3_data_path}/dashboard/output.parquet"
+dashboard_delta_path = f"{s3_data_path}/dashboard/delta/"
 metadata_path = f"{s3_data_path}/metadata/"
 report_file_path = f"{s3_data_path}/report/"
 
+# Saved report metadata index, seeded once from the report objects on s3 and the reports saved before them
+saved_reports = report_index.ReportIndex(storage_clients, metadata_path, seed_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "Data", "metadata.csv"))
+
+# Columns used by the Dash Application
+app_columns = [
+    "name_users", "email_users", "plan_users", "id_childrens", "name_childrens", "email_childrens",
+    "id_contents", "platform_contents", "createTime_contents", "alert_contents", "result_contents",
+    "id_comments", "commentTime_comments", "alert_comments", "result_comments"
+]
+
+# Approximate distinct counts, a relative error bound such as 0.01 turns them on, ranges holding fewer ids are still counted exactly
+count_error = float(os.environ["count_error"]) if os.environ.get("count_error") else None
+exact_count_limit = int(os.environ.get("exact_count_limit", 100000))
+
+# Aggregation backend of the dashboard charts, pandas or duckdb
+query_backend = os.environ.get("query_backend", "pandas")
+
+# Local directory holding an Arrow snapshot of the last loaded data, mapped on restart while its version is current
+snapshot_cache_dir = os.environ.get("snapshot_cache_dir", "cache/snapshot")
+
+# Bytes of csv parsed at a time, set it to bound the peak memory of loading the csv output, unset parses it in one go
+csv_block_size = int(os.environ["csv_block_size"]) if os.environ.get("csv_block_size") else None
+
+# Derived results shared by the workers on the host, with the seconds each namespace is kept for
+# metadata holds the saved reports, charts the outputs of the chart callbacks,
+# reports the report files with their links, reused while the presigned link has at least a minute left, and jobs the state of report jobs
+result_cache_dir = os.environ.get("result_cache_dir", "cache/results")
+metadata_reconcile_interval = int(os.environ.get("metadata_reconcile_interval", 600))
+report_url_expiry = 900
+result_cache_ttl = {"metadata": metadata_reconcile_interval, "charts": 300, "reports": report_url_expiry - 60, "jobs": 3600}
+result_cache = shared_cache.SharedCache(result_cache_dir, result_cache_ttl, max_bytes=int(os.environ.get("result_cache_bytes", 1024 * 2**20)),
+                                        memory_bytes=int(os.environ.get("result_cache_memory_bytes", 128 * 2**20)))
+
+# Reports are built in the background by report_workers threads of each worker, with at most report_queue_depth waiting or running
+report_jobs = job_queue.JobQueue(result_cache, max_workers=int(os.environ.get("report_workers", 2)),
+                                 max_queued=int(os.environ.get("report_queue_depth", 8)))
+
+# Excel reports are written report_chunk_rows rows at a time and uploaded in parts of report_part_bytes as they are zipped
+# Files up to report_inline_bytes are also sent through the page, larger ones are downloaded from their link
+report_chunk_rows = int(os.environ.get("report_chunk_rows", 10000))
+report_part_bytes = int(os.environ.get("report_part_bytes", 8 * 2**20))
+report_inline_bytes = int(os.environ.get("report_inline_bytes", 32 * 2**20))
+
+
+def parse_snapshot(data, columns=None):
+    df = pd.read_parquet(io.BytesIO(data), columns=columns)
+    return data_schema.compact_frame(data_schema.apply_schema(df))
+
+
+def csv_convert_options(columns=None):
+    # Missing values and timestamps are converted by the csv reader, categories arrive dictionary encoded
+    column_types = {column: pa.timestamp("ns") for column in data_schema.datetime_columns}
+    column_types.update({column: pa.dictionary(pa.int32(), pa.string()) for column in data_schema.category_columns})
+    column_types.update({column: pa.string() for column in data_schema.string_columns})
+    return pacsv.ConvertOptions(column_types=column_types, timestamp_parsers=[data_schema.datetime_format], null_values=data_schema.null_values,
+                                strings_can_be_null=True, include_columns=list(columns or []))
+
+
+def arrow_frame(data):
+    # Dictionary columns keep their categories in order of appearance, they are sorted the way astype("category") sorts them
+    df = data.to_pandas()
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].cat.reorder_categories(df[column].cat.categories.sort_values())
+    return df
 
-def read_s3():
-    s3_client = session.client("s3")
-
-    bucket_name = dashboard_data_path.split("/")[2]
-    file_key = "/".join(dashboard_data_path.split("/")[3:])
-    obj = s3_client.get_object(Bucket=bucket_name, Key=file_key)
-    data = obj['Body'].read().decode('utf-8')
 
-    df = pd.read_csv(io.StringIO(data), header=0)
-    df["createTime_contents"] = pd.to_datetime(df["createTime_contents"], format="%Y-%m-%d %H:%M:%S")
-    df["commentTime_comments"] = pd.to_datetime(df["commentTime_comments"], format="%Y-%m-%d %H:%M:%S")
+def read_csv_stream(stream, columns=None, block_size=None):
+    # Parsed by pyarrow on every core straight from the byte stream, without decoding it to a str first
+    # With a block_size, blocks are parsed one at a time and compacted before the next one is read,
+    # so the text and the string ids of the whole file are never held at once
+    convert_options = csv_convert_options(columns)
+    if block_size is None:
+        return data_schema.compact_frame(arrow_frame(pacsv.read_csv(stream, convert_options=convert_options)))
+
+    reader = pacsv.open_csv(stream, read_options=pacsv.ReadOptions(block_size=block_size), convert_options=convert_options)
+    frames, attrs = [], None
+    for batch in reader:
+        # Only the dictionary of the last block is kept, each one extends the previous
+        frame = data_schema.compact_frame(arrow_frame(batch), attrs)
+        attrs, frame.attrs = frame.attrs, {}
+        frames.append(frame)
+    if not frames:
+        return data_schema.compact_frame(arrow_frame(reader.schema.empty_table()))
+
+    df = pd.DataFrame({column: union_categoricals([frame[column] for frame in frames], sort_categories=True)
+                       if isinstance(frames[0][column].dtype, pd.CategoricalDtype) else pd.concat([frame[column] for frame in frames], ignore_index=True)
+                       for column in frames[0].columns})
+    df.attrs = attrs
     return df
 
 
-def get_info(df, user_logged_in_email):
-    df = df[df["email_users"] == user_logged_in_email]
-    user_info = df[["name_users", "email_users", "plan_users"]].iloc[0]
+def parse_csv(data, columns=None):
+    return read_csv_stream(io.BytesIO(data), columns)
+
+
+def read_s3(columns=None):
+    # Read once per version by the worker that publishes it to the local snapshot, the other workers map that instead
+    s3_client = storage_clients.s3()
+
+    # Columnar snapshot first, falling back to the csv output
+    bucket_name = dashboard_snapshot_path.split("/")[2]
+    file_key = "/".join(dashboard_snapshot_path.split("/")[3:])
+    try:
+        obj = s3_client.get_object(Bucket=bucket_name, Key=file_key)
+        return parse_snapshot(obj['Body'].read(), columns)
+    except s3_client.exceptions.NoSuchKey:
+        pass
+
+    bucket_name = dashboard_data_path.split("/")[2]
+    file_key = "/".join(dashboard_data_path.split("/")[3:])
+    obj = s3_client.get_object(Bucket=bucket_name, Key=file_key)
+    return read_csv_stream(obj['Body'], columns, csv_block_size)
+
+
+def list_deltas(after=None):
+    # Keys of the delta partitions written after the snapshot of a version, their time stamped names sort in the order they were written
+    # Partitions written before it are already part of it, they are left out until they are removed
+    s3_client = storage_clients.s3()
+    bucket_name = dashboard_delta_path.split("/")[2]
+    prefix = "/".join(dashboard_delta_path.split("/")[3:])
+    keys = []
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket_name, Prefix=prefix):
+        keys.extend(obj["Key"] for obj in page.get("Contents", []) if (after is None) or (obj["LastModified"] > after))
+    return sorted(keys)
+
+
+def read_deltas(keys, columns=None):
+    # Rows of the delta partitions in the snapshot schema, their ids are coded once they are merged into the dataset
+    s3_client = storage_clients.s3()
+    bucket_name = dashboard_delta_path.split("/")[2]
+    frames = [pd.read_parquet(io.BytesIO(s3_client.get_object(Bucket=bucket_name, Key=key)['Body'].read()), columns=columns) for key in keys]
+    return data_schema.apply_schema(pd.concat(frames, ignore_index=True))
+
+
+def data_version():
+    # ETag and last modified time of the dashboard data from a HEAD request, they change whenever a new file is written
+    s3_client = storage_clients.s3()
+    for path in [dashboard_snapshot_path, dashboard_data_path]:
+        bucket_name = path.split("/")[2]
+        file_key = "/".join(path.split("/")[3:])
+        try:
+            obj = s3_client.head_object(Bucket=bucket_name, Key=file_key)
+        except s3_client.exceptions.ClientError as error:
+            if error.response["Error"]["Code"] in ["404", "NoSuchKey"]:
+                continue
+            raise
+        etag = obj["ETag"].strip('"')
+        return f"{file_key}:{etag}:{obj['LastModified'].isoformat()}"
+    return None
+
+
+def version_time(version):
+    # Time the data of a version was written at on s3, the last field of data_version
+    return datetime.fromisoformat(version.split(":", 2)[2])
+
+
+def get_info(dataset, user_logged_in_email):
+    df = dataset.select(data_store.FilterSpec(user=user_logged_in_email), ["name_users", "email_users", "plan_users"])
+    user_info = df.iloc[0]
     return user_info
 
 
 def post_report_metadata(payload, current_time):
-    s3_client = session.client("s3")
+    s3_client = storage_clients.s3()
 
     new_metadata_path = metadata_path + "{}.json".format(current_time.strftime('%Y_%m_%d_%H_%M_%S_%f'))
     bucket_name = new_metadata_path.split("/")[2]
@@ -61,46 +217,76 @@ def post_report_metadata(payload, current_time):
         Body=json_payload,
         ContentType="application/json"
     )
+    insert_report_metadata(key, payload, datetime.now(timezone.utc))
     return True
 
 
+# Cached views of the saved reports belong to a generation, one full read of the index reconciled with the report objects on s3
+# A new generation is read once the previous one is metadata_reconcile_interval seconds old, the reports posted in between
+# are written through to the views of the current one
+def report_generation():
+    def reconcile():
+        generation = str(time.time_ns())
+        result_cache.set("metadata", ["frame", generation], read_report_metadata())
+        return generation
+    return result_cache.get("metadata", ["generation"], reconcile)
+
+
 def get_report_metadata():
-    fs = s3fs.S3FileSystem(
-        key=aws_access_key_id,
-        secret=aws_secret_access_key,
-        client_kwargs={'region_name': aws_region}
-    )
-    all_files = fs.glob(f"{metadata_path}*.json")
+    generation = report_generation()
+    metadata_df = result_cache.get("metadata", ["frame", generation], read_report_metadata)
+    recent = result_cache.peek("metadata", ["recent", generation])
+    if recent:
+        # A generation read after a report was posted already holds it, it is only listed once
+        metadata_df = pd.concat([report_index.records_frame(recent), metadata_df]).drop_duplicates(subset=["key"])
+        metadata_df = metadata_df.sort_values(by=["last_modified"], ascending=False, kind="stable")
+    return metadata_df
 
-    if len(all_files) > 0:
-        dfs = []
-        for file in all_files:
-            s3_path = f"s3://{file}"
 
-            with fs.open(s3_path, 'r') as f:
-                payload = json.load(f)
+def read_report_metadata():
+    return saved_reports.frame()
 
-            df_part = pd.json_normalize([payload])
-            df_part["last_modified"] = pd.to_datetime(fs.info(s3_path)["LastModified"])
-            dfs.append(df_part)
 
-        final_df = pd.concat(dfs, ignore_index=True)
-        final_df = final_df.sort_values(by=["last_modified"], ascending=False)
-        return final_df
-    else:
-        return pd.DataFrame()
+def insert_report_metadata(key, payload, last_modified):
+    # A posted report is added to the views of the current generation, rather than every report being read again
+    generation = report_generation()
+    record = {"key": key, "last_modified": last_modified.isoformat(), "payload": payload}
+    result_cache.update("metadata", ["recent", generation], lambda recent: (recent or []) + [record])
+    result_cache.update("metadata", ["user", generation, payload["email"]], lambda user_df: None if user_df is None else insert_user_report(user_df, record))
+
+
+def insert_user_report(user_df, record):
+    # The report goes ahead of the user's other reports, a view of a user without reports has no rows to replace
+    if user_df.empty or ("key" not in user_df.columns):
+        return report_index.records_frame([record])
+    return pd.concat([report_index.records_frame([record]), user_df[user_df["key"] != record["key"]]])
+
+
+def user_report_metadata(email):
+    metadata_df = get_report_metadata()
+    return metadata_df[metadata_df["email"] == email]
+
+
+def query_report_metadata(email, page=1, page_size=5):
+    # A page of the saved reports of one user, newest first, and how many they saved
+    # Each user's reports are cached on their own, so a page costs the same however many users and reports there are
+    # A missing one is built under the lock inserts take, so a report posted meanwhile is not left out of it
+    key = ["user", report_generation(), email]
+    user_df = result_cache.peek("metadata", key)
+    if user_df is None:
+        user_df = result_cache.update("metadata", key, lambda user_df: user_report_metadata(email) if user_df is None else user_df)
+    start = (page - 1) * page_size
+    return user_df.iloc[start:start + page_size], len(user_df)
 
 
-def generate_report(df, payload, send_buffer=None, preview=False):
+def generate_report(dataset, payload):
+    # Rows of a report, previewed as they are and written to its file by report_artifact
     fake = Faker()
-    shortener = pyshorteners.Shortener(timeout=10)
-    current_time = datetime.now()
 
     # Filtering Data
-    df = df[(df["email_users"] == payload["email"]) & (df["name_childrens"] == payload["children"])]
-
     start_date, end_date = pd.to_datetime(payload["timerange"])
-    df = df[pd.to_datetime(df["createTime_contents"]).between(start_date, end_date)]
+    spec = data_store.FilterSpec(user=payload["email"], member=payload["children"], time_column="createTime_contents", start_time=start_date, end_time=end_date)
+    df = dataset.select(spec, ["email_users", "name_childrens", "platform_contents", "createTime_contents", "alert_contents"])
 
     df = df[df["platform_contents"].str.lower().isin(payload["platform"])]
     df = df[df["alert_contents"].str.lower().isin(payload["alert"])]
@@ -116,64 +302,114 @@ def generate_report(df, payload, send_buffer=None, preview=False):
         "createTime_contents": "datetime",
         "alert_contents": "alert"
     })
-    if preview:
-        return df
+    return df
 
-    # Writing data to s3
-    s3_client = session.client("s3")
-    bucket_name = report_file_path.split("/")[2]
 
-    if payload["filetype"] == "xlsx":
-        key = "/".join(report_file_path.split("/")[3:]) + f"excel/export_{current_time.strftime('%Y_%m_%d_%H_%M_%S_%f')}.xlsx"
-
-        file_buffer = io.BytesIO()
-        df.to_excel(file_buffer, index=False)
-        data_bytes = file_buffer.getvalue()
-
-        file_buffer.seek(0)
-        s3_client.upload_fileobj(file_buffer, bucket_name, key)
-    elif payload["filetype"] == "pdf":
-        key = "/".join(report_file_path.split("/")[3:]) + f"pdf/export_{current_time.strftime('%Y_%m_%d_%H_%M_%S_%f')}.pdf"
-
-        fig, ax = plt.subplots(figsize=(12, 9))
-        ax.axis("off")
-        table = ax.table(
-            cellText=df.values,
-            colLabels=df.columns,
-            cellLoc="center",
-            loc="center"
-        )
-        table.set_fontsize(10)
-        table.scale(1.2, 1.2)
-
-        col_widths = []
-        for i, col in enumerate(df.columns):
-            max_len = max([len(str(col))] + [len(str(val)) for val in df.iloc[:, i]] )
-            col_widths.append(max_len)
-
-        col_widths = [w / max(col_widths) for w in col_widths]
-        for (row, col), cell in table.get_celld().items():
-            cell.set_width(col_widths[col] * 0.9)
-
-        file_buffer = io.BytesIO()
-        plt.savefig(file_buffer, format="pdf", bbox_inches="tight")
-        data_bytes = file_buffer.getvalue()
-
-        file_buffer.seek(0)
-        plt.close(fig)
-        s3_client.upload_fileobj(file_buffer, bucket_name, key)
+def write_xlsx(df, stream, chunk_rows=10000, progress=None):
+    # Rows are appended to a write-only workbook a chunk at a time, openpyxl spools them to a temporary file
+    # and zips the workbook straight into stream when it is saved, so neither the cells nor the file are held in memory
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Sheet1")
+    worksheet.append([str(column) for column in df.columns])
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows].astype(object)
+        for row in chunk.where(chunk.notna(), None).itertuples(index=False, name=None):
+            worksheet.append(row)
+        if progress is not None:
+            progress((start + len(chunk)) / len(df))
+    workbook.save(stream)
+
+
+def pdf_file(df):
+    # A figure of its own rather than one from pyplot, whose global state is not safe to share between the report threads
+    fig = Figure(figsize=(12, 9))
+    ax = fig.subplots()
+    ax.axis("off")
+    table = ax.table(
+        cellText=df.values,
+        colLabels=df.columns,
+        cellLoc="center",
+        loc="center"
+    )
+    table.set_fontsize(10)
+    table.scale(1.2, 1.2)
+
+    col_widths = []
+    for i, col in enumerate(df.columns):
+        max_len = max([len(str(col))] + [len(str(val)) for val in df.iloc[:, i]] )
+        col_widths.append(max_len)
+
+    col_widths = [w / max(col_widths) for w in col_widths]
+    for (row, col), cell in table.get_celld().items():
+        cell.set_width(col_widths[col] * 0.9)
+
+    file_buffer = io.BytesIO()
+    fig.savefig(file_buffer, format="pdf", bbox_inches="tight")
+    return file_buffer.getvalue()
+
+
+def upload_report(df, filetype, current_time, progress=None):
+    # Key, link and bytes of the report file, the bytes are None when the file is larger than report_inline_bytes
+    # Excel files are streamed into a multipart upload while they are written, pdf files are built in memory and put whole
+    s3_client = storage_clients.s3()
+    shortener = pyshorteners.Shortener(timeout=10)
+    bucket_name = report_file_path.split("/")[2]
+    folder = {"xlsx": "excel", "pdf": "pdf"}[filetype]
+    key = "/".join(report_file_path.split("/")[3:]) + f"{folder}/export_{current_time.strftime('%Y_%m_%d_%H_%M_%S_%f')}.{filetype}"
+    if filetype == "xlsx":
+        with storage.MultipartWriter(s3_client, bucket_name, key, part_size=report_part_bytes, keep_bytes=report_inline_bytes) as writer:
+            write_xlsx(df, writer, report_chunk_rows, progress)
+        data_bytes = writer.kept
+    else:
+        data_bytes = pdf_file(df)
+        s3_client.upload_fileobj(io.BytesIO(data_bytes), bucket_name, key)
+        data_bytes = data_bytes if len(data_bytes) <= report_inline_bytes else None
 
     url = s3_client.generate_presigned_url(
         "get_object",
         Params={"Bucket": bucket_name, "Key": key},
-        ExpiresIn=900
+        ExpiresIn=report_url_expiry
     )
     url = shortener.tinyurl.short(url)
+    return key, url, data_bytes
 
-    if send_buffer is None:
-        return df, url
-    else:
-        return df, url, data_bytes
+
+def report_digest(payload):
+    # The fields a report is built from, with the order of the choices in its lists left out
+    report = {field: payload.get(field) for field in ["email", "children", "timerange", "platform", "alert", "contenttype", "filetype"]}
+    for field in ["platform", "alert", "contenttype"]:
+        if isinstance(report[field], list):
+            report[field] = sorted(report[field])
+    return hashlib.sha256(json.dumps(report, sort_keys=True).encode()).hexdigest()
+
+
+def report_artifact(dataset, version, payload, progress=None):
+    # File of a report with its s3 key and link, built and uploaded once per payload and version of the data
+    # and looked up by every later download, until its link is close to expiring
+    # progress is called with the share of the build done as it goes, files too large to send through the page are left without one
+    progress = progress or (lambda fraction: None)
+
+    def build():
+        current_time = datetime.now()
+        df = generate_report(dataset, payload)
+        progress(0.3)
+        key, url, data_bytes = upload_report(df, payload["filetype"], current_time, lambda fraction: progress(0.3 + 0.6 * fraction))
+        artifact = {"key": key, "url": url}
+        if data_bytes is not None:
+            artifact["file"] = data_bytes
+        return artifact
+    return result_cache.get("reports", [report_digest(payload), version], build)
+
+
+def cached_report_artifact(version, payload):
+    # The file report_artifact left for the payload and version, None once it has expired, it is never built here
+    return result_cache.peek("reports", [report_digest(payload), version])
+
+
+def report_job(progress, dataset, version, payload):
+    # Run by report_jobs, the file is left in the reports namespace and looked up again with the version it was built for
+    artifact = report_artifact(dataset, version, payload, progress)
+    return {"key": artifact["key"], "url": artifact["url"], "version": version}
 
 
 if __name__ == "__main__":
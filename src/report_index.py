@@ -0,0 +1,112 @@
+# Importing Libraries
+import os
+import json
+import concurrent.futures
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+
+
+# Fields of a report payload, the columns a frame of saved reports has even when there are none
+payload_columns = ["email", "children", "timerange", "platform", "alert", "contenttype", "filetype"]
+
+
+def records_frame(records):
+    # Saved reports with the columns of their payload, their key and the time they were saved, newest first
+    records = sorted(records, key=lambda record: record["key"])
+    df = pd.json_normalize([record["payload"] for record in records]) if records else pd.DataFrame(columns=payload_columns)
+    df["key"] = pd.Series([record["key"] for record in records], index=df.index, dtype=object)
+    df["last_modified"] = pd.to_datetime([record["last_modified"] for record in records], utc=True, format="ISO8601")
+    return df.sort_values(by=["last_modified"], ascending=False, kind="stable")
+
+
+# Saved report metadata consolidated in one JSON lines object next to the per report JSON objects, one line per report
+# The per report objects stay the source of truth, the index is read with one GET and one LIST of the objects written after its
+# watermark, the reports posted since it was last written are read and folded into it, and it is built from all of them when it is missing
+class ReportIndex:
+    def __init__(self, storage_clients, metadata_path, seed_path=None, settle_seconds=300):
+        self.storage_clients = storage_clients
+        self.bucket_name = metadata_path.split("/")[2]
+        self.prefix = "/".join(metadata_path.split("/")[3:])
+        self.index_key = self.prefix + "index.jsonl"
+        self.seed_path = seed_path
+        self.settle = timedelta(seconds=settle_seconds)
+
+    def is_report(self, key):
+        return key.startswith(self.prefix) and key.endswith(".json") and ("/" not in key[len(self.prefix):])
+
+    def read_index(self):
+        s3_client = self.storage_clients.s3()
+        try:
+            data = s3_client.get_object(Bucket=self.bucket_name, Key=self.index_key)["Body"].read()
+        except s3_client.exceptions.NoSuchKey:
+            return None
+        return [json.loads(line) for line in data.decode("utf-8").splitlines() if line]
+
+    def write_index(self, records):
+        body = "".join(json.dumps(record) + "\n" for record in sorted(records, key=lambda record: record["key"]))
+        self.storage_clients.s3().put_object(Bucket=self.bucket_name, Key=self.index_key, Body=body.encode("utf-8"), ContentType="application/x-ndjson")
+
+    def list_reports(self, start_after=None):
+        s3_client = self.storage_clients.s3()
+        arguments = {"Bucket": self.bucket_name, "Prefix": self.prefix}
+        if start_after is not None:
+            arguments["StartAfter"] = start_after
+        objects = []
+        for page in s3_client.get_paginator("list_objects_v2").paginate(**arguments):
+            objects.extend(obj for obj in page.get("Contents", []) if self.is_report(obj["Key"]))
+        return objects
+
+    def read_reports(self, objects):
+        # Fetched over the connections of the shared client, as many at once as its pool holds
+        s3_client = self.storage_clients.s3()
+
+        def read_report(obj):
+            payload = json.loads(s3_client.get_object(Bucket=self.bucket_name, Key=obj["Key"])["Body"].read())
+            return {"key": obj["Key"], "last_modified": obj["LastModified"].isoformat(), "payload": payload}
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.storage_clients.pool_size) as executor:
+            return list(executor.map(read_report, objects))
+
+    def seed_records(self):
+        # Reports saved before they were written to s3, they only carry the time they were created at
+        if (self.seed_path is None) or (not os.path.exists(self.seed_path)):
+            return []
+        seed_df = pd.read_csv(self.seed_path, dtype=str, keep_default_na=False)
+        records = []
+        for position, row in seed_df.iterrows():
+            payload = {column: json.loads(value) if value.startswith("[") else value for column, value in row.items() if column != "created_at"}
+            payload.setdefault("filetype", "xlsx")
+            last_modified = datetime.strptime(row["created_at"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+            records.append({"key": f"seed/{os.path.basename(self.seed_path)}/{position:06d}", "last_modified": last_modified.isoformat(), "payload": payload})
+        return records
+
+    def watermark(self, records):
+        # Reports are named by the time they were posted, so those written well before the newest one indexed are all in the index
+        reports = [(datetime.fromisoformat(record["last_modified"]), record["key"]) for record in records if self.is_report(record["key"])]
+        if not reports:
+            return None
+        settled = max(reports)[0] - self.settle
+        keys = [key for time, key in reports if time <= settled]
+        return max(keys) if keys else None
+
+    def records(self):
+        records = self.read_index()
+        if records is None:
+            records = self.seed_records() + self.read_reports(self.list_reports())
+            self.write_index(records)
+            return records
+
+        indexed = {record["key"] for record in records}
+        missing = [obj for obj in self.list_reports(self.watermark(records)) if obj["Key"] not in indexed]
+        if missing:
+            records = records + self.read_reports(missing)
+            self.write_index(records)
+        return records
+
+    def frame(self):
+        # Every saved report, newest first
+        return records_frame(self.records())
+
+
+if __name__ == "__main__":
+    print("Saved Report Metadata Index")
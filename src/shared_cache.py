@@ -0,0 +1,247 @@
+# Importing Libraries
+import os
+import json
+import time
+import fcntl
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import plotly.io
+
+# Kinds of cached values, frames are written as Arrow IPC streams, callback outputs as the plotly json Dash sends for them
+# and records, dicts holding bytes such as a report file, with their bytes after a json header of their other fields
+FRAME, BYTES, JSON, RECORD = "frame", "bytes", "json", "record"
+
+
+def encode_frame(df):
+    # The frame and each id dictionary in its attrs are separate Arrow IPC streams, the header lists them in order
+    # The id lookups are not written, they are rebuilt from the dictionary the first time a delta needs them
+    tables = [("frame", pa.Table.from_pandas(df))]
+    for column, dictionary in df.attrs.get("id_dictionary", {}).items():
+        tables.append((column, pa.table({column: pa.array(np.asarray(dictionary, dtype=object), type=pa.string())})))
+    parts = []
+    for name, table in tables:
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        parts.append((name, sink.getvalue().to_pybytes()))
+    return [[name, len(data)] for name, data in parts], b"".join(data for _, data in parts)
+
+
+def decode_frame(parts, data):
+    offset, tables = 0, {}
+    for name, size in parts:
+        tables[name] = pa.ipc.open_stream(pa.py_buffer(data[offset:offset + size])).read_all()
+        offset += size
+    df = tables.pop("frame").to_pandas()
+    # Lists come back from Arrow as numpy arrays, they are given back as the lists that were cached
+    for column in df.columns:
+        if (df[column].dtype == object) and df[column].map(lambda value: isinstance(value, np.ndarray)).any():
+            df[column] = df[column].map(lambda value: value.tolist() if isinstance(value, np.ndarray) else value)
+    if tables:
+        df.attrs["id_dictionary"] = {column: table.column(0).to_numpy(zero_copy_only=False).astype(object) for column, table in tables.items()}
+        df.attrs["id_lookup"] = {}
+    return df
+
+
+def encode(value):
+    if isinstance(value, pd.DataFrame):
+        parts, data = encode_frame(value)
+        return {"kind": FRAME, "parts": parts}, data
+    if isinstance(value, bytes):
+        return {"kind": BYTES}, value
+    if isinstance(value, dict) and any(isinstance(item, bytes) for item in value.values()):
+        fields = {name: item for name, item in value.items() if not isinstance(item, bytes)}
+        parts = [[name, len(item)] for name, item in value.items() if isinstance(item, bytes)]
+        return {"kind": RECORD, "fields": fields, "parts": parts}, b"".join(item for item in value.values() if isinstance(item, bytes))
+    return {"kind": JSON}, plotly.io.json.to_json_plotly(value).encode()
+
+
+def decode(header, data):
+    if header["kind"] == FRAME:
+        return decode_frame(header["parts"], data)
+    if header["kind"] == BYTES:
+        return data
+    if header["kind"] == RECORD:
+        value, offset = dict(header["fields"]), 0
+        for name, size in header["parts"]:
+            value[name] = data[offset:offset + size]
+            offset += size
+        return value
+    return json.loads(data)
+
+
+# Derived results shared by every worker on the host through a cache directory, point it at /dev/shm to keep it in memory
+# Each entry is a file written in a single rename, so readers never see a partial one, its modification time is when it was written
+# and its access time is moved on every hit, the least recently used entries are removed once the directory holds more than max_bytes
+# A worker also keeps up to memory_bytes of the entries it read, checked against the file on every hit so a removed entry is not served
+class SharedCache:
+    def __init__(self, directory, ttl, default_ttl=300, max_bytes=1024 * 2**20, memory_bytes=128 * 2**20, prune_interval=60):
+        self.directory = directory
+        self.ttl = ttl
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.prune_interval = prune_interval
+        self.pruned = 0
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.entry_bytes = 0
+        self.counters = {}
+
+    def path(self, namespace, key):
+        digest = hashlib.blake2b(json.dumps([namespace, key], sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, namespace, digest)
+
+    def count(self, namespace, counter):
+        with self.lock:
+            counters = self.counters.setdefault(namespace, {"hits": 0, "misses": 0})
+            counters[counter] += 1
+
+    def stats(self):
+        with self.lock:
+            return {"namespaces": {namespace: dict(counters) for namespace, counters in self.counters.items()},
+                    "memory_entries": len(self.entries), "memory_bytes": self.entry_bytes}
+
+    def remember(self, path, written, header, data):
+        if len(data) > self.memory_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(path, None)
+            if previous is not None:
+                self.entry_bytes -= len(previous[2])
+            self.entries[path] = (written, header, data)
+            self.entry_bytes += len(data)
+            while self.entry_bytes > self.memory_bytes:
+                _, (_, _, evicted) = self.entries.popitem(last=False)
+                self.entry_bytes -= len(evicted)
+
+    def forget(self, path):
+        with self.lock:
+            entry = self.entries.pop(path, None)
+            if entry is not None:
+                self.entry_bytes -= len(entry[2])
+
+    def read(self, namespace, path):
+        # Header and bytes of an entry still within the ttl of its namespace, None when there is none
+        try:
+            status = os.stat(path)
+        except FileNotFoundError:
+            self.forget(path)
+            return None
+        if time.time() - status.st_mtime > self.ttl.get(namespace, self.default_ttl):
+            self.forget(path)
+            return None
+
+        with self.lock:
+            entry = self.entries.get(path)
+            if (entry is not None) and (entry[0] == status.st_mtime_ns):
+                self.entries.move_to_end(path)
+        if (entry is None) or (entry[0] != status.st_mtime_ns):
+            try:
+                with open(path, "rb") as entry_file:
+                    header = json.loads(entry_file.readline())
+                    data = entry_file.read()
+            except FileNotFoundError:
+                self.forget(path)
+                return None
+            self.remember(path, status.st_mtime_ns, header, data)
+        else:
+            _, header, data = entry
+        os.utime(path, ns=(time.time_ns(), status.st_mtime_ns))
+        return header, data
+
+    def write(self, path, header, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, staging = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".")
+        with os.fdopen(descriptor, "wb") as entry_file:
+            entry_file.write(json.dumps(header).encode() + b"\n")
+            entry_file.write(data)
+        os.replace(staging, path)
+        self.remember(path, os.stat(path).st_mtime_ns, header, data)
+
+    def get(self, namespace, key, compute):
+        # Cached value of key in the namespace, computed and stored when there is none
+        path = self.path(namespace, key)
+        entry = self.read(namespace, path)
+        if entry is not None:
+            self.count(namespace, "hits")
+            return decode(*entry)
+
+        self.count(namespace, "misses")
+        value = compute()
+        try:
+            header, data = encode(value)
+        except (pa.ArrowException, TypeError, ValueError):
+            # Values Arrow or json cannot hold are returned without being cached
+            return value
+        if len(data) <= self.max_bytes:
+            self.write(path, header, data)
+        self.prune()
+        return value
+
+    def peek(self, namespace, key):
+        # Cached value of key in the namespace, None when there is none
+        entry = self.read(namespace, self.path(namespace, key))
+        self.count(namespace, "misses" if entry is None else "hits")
+        return None if entry is None else decode(*entry)
+
+    def set(self, namespace, key, value):
+        header, data = encode(value)
+        self.write(self.path(namespace, key), header, data)
+
+    def update(self, namespace, key, function):
+        # Read, changed and written back under a lock held across workers, so concurrent updates are not lost
+        # function is given the cached value or None, and returns the new one, or the one it was given or None to leave the entry as it is
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "update.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                entry = self.read(namespace, self.path(namespace, key))
+                current = None if entry is None else decode(*entry)
+                value = function(current)
+                if (value is not None) and (value is not current):
+                    self.set(namespace, key, value)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return value
+
+    def prune(self):
+        # Expired entries are removed, then the least recently read ones until the directory is back under max_bytes
+        if time.monotonic() - self.pruned < self.prune_interval:
+            return
+        self.pruned = time.monotonic()
+        now, files = time.time(), []
+        for namespace in os.listdir(self.directory):
+            directory = os.path.join(self.directory, namespace)
+            for name in os.listdir(directory) if os.path.isdir(directory) else []:
+                path = os.path.join(directory, name)
+                try:
+                    status = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.startswith(".") and (now - status.st_mtime < self.prune_interval):
+                    continue
+                if name.startswith(".") or (now - status.st_mtime > self.ttl.get(namespace, self.default_ttl)):
+                    files.append((0, path, status.st_size))
+                else:
+                    files.append((status.st_atime, path, status.st_size))
+
+        total = sum(size for _, _, size in files)
+        for access_time, path, size in sorted(files):
+            if (access_time > 0) and (total <= self.max_bytes):
+                break
+            self.forget(path)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+if __name__ == "__main__":
+    print("Shared Cache of Derived Results")
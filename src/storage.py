@@ -0,0 +1,247 @@
+# Importing Libraries
+import os
+import io
+import uuid
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone
+import boto3
+import botocore.config
+import botocore.exceptions
+
+
+def client_error(code, message, operation):
+    return botocore.exceptions.ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+# A local directory answering the calls the dashboard makes to s3, each bucket is a directory and each key a file path inside it
+# Errors are raised as the ClientError codes s3 returns, so the same except clauses handle both
+class LocalS3Client:
+    class exceptions:
+        ClientError = botocore.exceptions.ClientError
+
+        class NoSuchKey(botocore.exceptions.ClientError):
+            pass
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, bucket, key):
+        return os.path.join(self.directory, bucket, *key.split("/"))
+
+    def describe(self, bucket, key):
+        # The ETag is made from the size and modification time, it changes with every write without reading the file
+        path = self.path(bucket, key)
+        if not os.path.isfile(path):
+            return None
+        status = os.stat(path)
+        return {"Key": key, "ETag": f'"{status.st_size:x}-{status.st_mtime_ns:x}"', "ContentLength": status.st_size, "Size": status.st_size,
+                "LastModified": datetime.fromtimestamp(status.st_mtime, tz=timezone.utc)}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        description = self.describe(Bucket, Key)
+        if description is None:
+            raise self.exceptions.NoSuchKey({"Error": {"Code": "NoSuchKey", "Message": Key}}, "GetObject")
+        with open(self.path(Bucket, Key), "rb") as object_file:
+            return dict(description, Body=io.BytesIO(object_file.read()))
+
+    def head_object(self, Bucket, Key, **kwargs):
+        description = self.describe(Bucket, Key)
+        if description is None:
+            raise client_error("404", "Not Found", "HeadObject")
+        return description
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        # Written next to the final path and renamed over it, so a reader sees the previous object or the new one
+        path = self.path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(Body, str):
+            Body = Body.encode()
+        descriptor, staging = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".")
+        with os.fdopen(descriptor, "wb") as object_file:
+            object_file.write(Body if isinstance(Body, bytes) else Body.read())
+        os.replace(staging, path)
+        return {"ETag": self.describe(Bucket, Key)["ETag"]}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, **kwargs):
+        self.put_object(Bucket, Key, Fileobj)
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        for obj in Delete["Objects"]:
+            try:
+                os.remove(self.path(Bucket, obj["Key"]))
+            except FileNotFoundError:
+                pass
+        return {"Deleted": [{"Key": obj["Key"]} for obj in Delete["Objects"]]}
+
+    def list_objects(self, Bucket, Prefix="", StartAfter=""):
+        root = os.path.join(self.directory, Bucket)
+        keys = []
+        for directory, _, names in os.walk(root):
+            for name in names:
+                key = os.path.relpath(os.path.join(directory, name), root).replace(os.sep, "/")
+                if key.startswith(Prefix) and (key > StartAfter) and not name.startswith("."):
+                    keys.append(key)
+        return [self.describe(Bucket, key) for key in sorted(keys)]
+
+    def get_paginator(self, operation_name):
+        if operation_name != "list_objects_v2":
+            raise NotImplementedError(operation_name)
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix="", StartAfter="", PaginationConfig=None, **kwargs):
+                objects = [obj for obj in client.list_objects(Bucket, Prefix, StartAfter) if obj is not None]
+                page_size = (PaginationConfig or {}).get("PageSize", 1000)
+                for start in range(0, len(objects), page_size):
+                    yield {"Contents": objects[start:start + page_size], "KeyCount": len(objects[start:start + page_size])}
+                if not objects:
+                    yield {"KeyCount": 0}
+        return Paginator()
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, **kwargs):
+        return "file://" + os.path.abspath(self.path(Params["Bucket"], Params["Key"]))
+
+    def upload_path(self, bucket, upload_id):
+        # Parts are kept outside the bucket directories until the upload is completed, so they are never listed
+        return os.path.join(self.directory, ".uploads", bucket, upload_id)
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self.upload_path(Bucket, upload_id))
+        return {"Bucket": Bucket, "Key": Key, "UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        path = os.path.join(self.upload_path(Bucket, UploadId), f"{PartNumber:05d}")
+        if not os.path.isdir(os.path.dirname(path)):
+            raise client_error("NoSuchUpload", UploadId, "UploadPart")
+        with open(path, "wb") as part_file:
+            part_file.write(Body if isinstance(Body, bytes) else Body.read())
+        return {"ETag": f'"{os.path.getsize(path):x}-{PartNumber:x}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        # The parts are copied one after another into a file renamed over the final path, like put_object
+        upload_path = self.upload_path(Bucket, UploadId)
+        path = self.path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, staging = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".")
+        with os.fdopen(descriptor, "wb") as object_file:
+            for part in sorted(MultipartUpload["Parts"], key=lambda part: part["PartNumber"]):
+                with open(os.path.join(upload_path, f"{part['PartNumber']:05d}"), "rb") as part_file:
+                    shutil.copyfileobj(part_file, object_file)
+        os.replace(staging, path)
+        shutil.rmtree(upload_path, ignore_errors=True)
+        return {"Bucket": Bucket, "Key": Key, "ETag": self.describe(Bucket, Key)["ETag"]}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        shutil.rmtree(self.upload_path(Bucket, UploadId), ignore_errors=True)
+        return {}
+
+
+# A writable stream uploaded to s3 as it is written, one part each time part_size bytes have gathered, so at most about a part is held
+# A stream smaller than a part is written with a single put instead, s3 takes parts of at least 5 MiB apart from the last one
+# Up to keep_bytes of the stream are also kept, kept holds all of it once it is closed, or None when it was larger
+class MultipartWriter:
+    def __init__(self, s3_client, bucket, key, part_size=8 * 2**20, keep_bytes=0):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.keep_bytes = keep_bytes
+        self.buffer = bytearray()
+        self.kept = bytearray() if keep_bytes else None
+        self.parts = []
+        self.upload_id = None
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        self.size += len(data)
+        if (self.kept is not None) and (self.size <= self.keep_bytes):
+            self.kept += data
+        else:
+            self.kept = None
+        while len(self.buffer) >= self.part_size:
+            self.upload_part(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def upload_part(self, data):
+        if self.upload_id is None:
+            self.upload_id = self.s3_client.create_multipart_upload(Bucket=self.bucket, Key=self.key)["UploadId"]
+        number = len(self.parts) + 1
+        response = self.s3_client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=data)
+        self.parts.append({"ETag": response["ETag"], "PartNumber": number})
+
+    def close(self):
+        if self.upload_id is None:
+            self.s3_client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self.buffer))
+        else:
+            if self.buffer:
+                self.upload_part(bytes(self.buffer))
+            self.s3_client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": self.parts})
+        self.buffer = bytearray()
+        if self.kept is not None:
+            self.kept = bytes(self.kept)
+
+    def abort(self):
+        # Parts already uploaded are removed, s3 keeps and bills them until an upload is completed or aborted
+        if self.upload_id is not None:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        self.buffer, self.kept = bytearray(), None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        if exception_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+# s3 clients shared by every thread of a process, boto3 clients are thread safe once created
+# Each one keeps a pool of keep-alive connections, so calls after the first skip the TCP and TLS handshakes,
+# and retries throttled or failed calls with exponential backoff
+# With a local_directory the same calls are answered from local files, to run or benchmark the dashboard offline
+class StorageClients:
+    def __init__(self, region_name, access_key_id=None, secret_access_key=None, local_directory=None, pool_size=32, max_attempts=5,
+                 retry_mode="adaptive", connect_timeout=5, read_timeout=60):
+        self.region_name = region_name
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.local_directory = local_directory
+        self.pool_size = pool_size
+        self.config = botocore.config.Config(region_name=region_name, max_pool_connections=pool_size, tcp_keepalive=True,
+                                             connect_timeout=connect_timeout, read_timeout=read_timeout,
+                                             retries={"max_attempts": max_attempts, "mode": retry_mode})
+        self.lock = threading.Lock()
+        self.client = None
+        self.pid = None
+
+    def create(self):
+        if self.local_directory:
+            return LocalS3Client(self.local_directory)
+        session = boto3.session.Session(region_name=self.region_name, aws_access_key_id=self.access_key_id, aws_secret_access_key=self.secret_access_key)
+        return session.client("s3", config=self.config)
+
+    def s3(self):
+        # Created on first use, a forked worker creates its own rather than sharing the sockets of its parent
+        pid = os.getpid()
+        if (self.client is None) or (self.pid != pid):
+            with self.lock:
+                if (self.client is None) or (self.pid != pid):
+                    self.client = self.create()
+                    self.pid = pid
+        return self.client
+
+
+if __name__ == "__main__":
+    print("Shared Storage Clients")
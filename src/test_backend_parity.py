@@ -0,0 +1,102 @@
+# Importing Libraries
+import io
+import pytest
+import pandas as pd
+import data_schema
+import data_generation
+import data_store as ds
+import miscellaneous_functions as mf
+from chart_queries import chart_aggregations, comment_month_aggregations, month_rows
+
+pytest.importorskip("duckdb")
+
+
+def snapshot_bytes(df):
+    # Rows written to parquet like the data generation writes the snapshot
+    buffer = io.BytesIO()
+    data_schema.apply_schema(df.copy()).to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def schema_rows(df):
+    # Rows as the dashboard reads them from s3, before their ids are coded
+    return data_schema.apply_schema(pd.read_parquet(io.BytesIO(snapshot_bytes(df)), columns=mf.app_columns))
+
+
+def spanning_rows(df, count=40):
+    # Contents posted again three days later keep their content and comment ids, so those ids fall in two day cells of both cubes
+    moved = df.sample(count, random_state=1).copy()
+    moved["createTime_contents"] = (pd.to_datetime(moved["createTime_contents"]) + pd.Timedelta(days=3)).dt.strftime("%Y-%m-%d %H:%M:%S")
+    return pd.concat([df, moved], ignore_index=True)
+
+
+@pytest.fixture(scope="module")
+def generated():
+    return data_generation.generate_data(4000)
+
+
+# The same data loaded once per backend, with cubes whose ids each fall in a single cell, cubes where some ids span cells,
+# and the spanning data with its last rows merged in as a delta segment
+@pytest.fixture(scope="module", params=["exact", "spanning", "delta"])
+def datasets(request, generated):
+    base, delta = (generated.iloc[:-300], generated.iloc[-300:]) if request.param == "delta" else (generated, None)
+    base = base if request.param == "exact" else spanning_rows(base)
+    datasets = {}
+    for name, backend in ds.backends.items():
+        dataset = ds.Dataset(mf.parse_snapshot(snapshot_bytes(base), mf.app_columns), backend=backend())
+        if delta is not None:
+            dataset = dataset.append(schema_rows(delta), ["delta"])
+            assert dataset.delta is not None
+        assert dataset.content_cube.exact == (request.param == "exact")
+        datasets[name] = dataset
+    return datasets
+
+
+def user_specs(dataset):
+    # Every user on its own and with each of its members, like the dashboard filters
+    for email in dataset.select(ds.FilterSpec(), ["email_users"])["email_users"].dropna().unique():
+        members = dataset.user_frame(email)["name_childrens"].dropna().unique()
+        for member in [None] + list(members):
+            yield ds.FilterSpec(user=email, member=member)
+
+
+def test_cube_charts(datasets):
+    # Cube counts match between the backends, and match the distinct ids of the rows they stand for
+    reference = datasets["pandas"]
+    for spec in user_specs(reference):
+        for chart, (cube_name, by, valid) in chart_aggregations.items():
+            cell_spec = spec.narrow(valid=valid)
+            results = {}
+            for name, dataset in datasets.items():
+                cube = getattr(dataset, cube_name)
+                results[name] = cube.counts(cube.select(cell_spec, by), by)
+            id_column = getattr(reference, cube_name).id_column
+            rows = reference.select(cell_spec, by + [id_column])
+            expected = reference.backend.grouped_distinct_count(rows, by, id_column).rename(columns={id_column: "count"})
+            for name, result in results.items():
+                pd.testing.assert_frame_equal(result, expected, obj=f"{chart} {name} {spec}")
+
+
+def test_cube_totals(datasets):
+    # KPI totals and their monthly counts match between the backends and the distinct ids of the rows
+    reference = datasets["pandas"]
+    for spec in user_specs(reference):
+        cell_spec = spec.narrow(valid=("alert_contents",))
+        rows = reference.select(cell_spec, ["createTime_contents", "id_contents"])
+        expected_total = rows["id_contents"].nunique()
+        expected_months = rows.groupby(pd.Grouper(key="createTime_contents", freq="M"))["id_contents"].nunique()
+        for name, dataset in datasets.items():
+            cube = dataset.content_cube
+            assert cube.total(cube.select(cell_spec, [])) == expected_total, f"{name} {spec}"
+            months = cube.period_counts(cube.select(cell_spec, ["day"]), "M")
+            pd.testing.assert_series_equal(months, expected_months, check_names=False, check_index_type=False, check_freq=False, obj=f"{name} {spec}")
+
+
+def test_comment_month_charts(datasets):
+    # Raw comment rows grouped by month give the same distinct counts on every backend
+    reference = datasets["pandas"]
+    for spec in user_specs(reference):
+        for chart, (by, valid, month_label) in comment_month_aggregations.items():
+            rows = month_rows(reference, spec.narrow(time_column="commentTime_comments", valid=valid), by + ["id_comments"], month_label)
+            results = {name: dataset.backend.grouped_distinct_count(rows, by, "id_comments") for name, dataset in datasets.items()}
+            pd.testing.assert_frame_equal(results["pandas"], results["duckdb"], obj=f"{chart} {spec}")
@@ -0,0 +1,58 @@
+# Importing Libraries
+from datetime import datetime
+import pytest
+import pandas as pd
+import report_index
+import shared_cache
+import storage
+import miscellaneous_functions as mf
+
+
+# Saved reports kept in a local bucket and a result cache of their own
+@pytest.fixture
+def reports(tmp_path, monkeypatch):
+    storage_clients = storage.StorageClients(mf.aws_region, local_directory=str(tmp_path / "s3"))
+    monkeypatch.setattr(mf, "storage_clients", storage_clients)
+    monkeypatch.setattr(mf, "saved_reports", report_index.ReportIndex(storage_clients, mf.metadata_path))
+    monkeypatch.setattr(mf, "result_cache", shared_cache.SharedCache(str(tmp_path / "cache"), mf.result_cache_ttl))
+    return mf
+
+
+def payload(email):
+    return {"email": email, "children": "Alex", "timerange": ["2024-01-01", "2024-01-31"], "platform": ["Instagram"], "alert": ["High"],
+            "contenttype": ["Comments"], "filetype": "xlsx"}
+
+
+def test_empty_index_has_columns(reports):
+    metadata_df = reports.get_report_metadata()
+    assert metadata_df.empty
+    assert set(report_index.payload_columns + ["key", "last_modified"]) <= set(metadata_df.columns)
+
+
+def test_first_report_of_a_user(reports):
+    # The user's empty page is cached before their first report is posted
+    user_df, total = reports.query_report_metadata("first@chatstat.com")
+    assert total == 0
+    assert "key" in user_df.columns
+
+    reports.post_report_metadata(payload("first@chatstat.com"), datetime(2024, 2, 1, 12, 0, 0))
+    user_df, total = reports.query_report_metadata("first@chatstat.com")
+    assert total == 1
+    assert user_df["key"].tolist() == [mf.metadata_path.split("/", 3)[3] + "2024_02_01_12_00_00_000000.json"]
+    assert user_df["email"].tolist() == ["first@chatstat.com"]
+
+
+def test_user_without_reports_alongside_others(reports):
+    reports.post_report_metadata(payload("other@chatstat.com"), datetime(2024, 2, 1, 12, 0, 0))
+    assert reports.query_report_metadata("first@chatstat.com")[1] == 0
+
+    reports.post_report_metadata(payload("first@chatstat.com"), datetime(2024, 2, 2, 12, 0, 0))
+    assert reports.query_report_metadata("first@chatstat.com")[1] == 1
+    assert reports.query_report_metadata("other@chatstat.com")[1] == 1
+
+
+def test_insert_into_a_view_without_columns(reports):
+    # Views cached before they carried the index columns are treated as having no reports
+    record = {"key": "metadata/2024_02_01_12_00_00_000000.json", "last_modified": "2024-02-01T12:00:00+00:00", "payload": payload("first@chatstat.com")}
+    user_df = reports.insert_user_report(pd.DataFrame(), record)
+    assert user_df["key"].tolist() == [record["key"]]